@@ -0,0 +1,61 @@
+"""Requests per second with and without the cached JWT principal.
+
+    python -m benchmarks.auth --requests 2000
+
+Sends authenticated requests through the full Django stack in-process,
+once with simplejwt's JWTAuthentication.get_user (a user query per
+request) and once with CachedJWTAuthentication.
+"""
+import argparse
+import time
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_arguments(parser)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    common.setup(args.database)
+
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from user.authentication import CachedJWTAuthentication
+
+    user, _ = get_user_model().objects.get_or_create(
+        email="auth@library.test", defaults={"username": "auth"}
+    )
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZE=f"Bearer {AccessToken.for_user(user)}")
+    etag = client.get("/api/borrowings/")["ETag"]
+    endpoints = {
+        "GET /api/user/me/": {"path": "/api/user/me/"},
+        "poll /api/borrowings/ (304)": {
+            "path": "/api/borrowings/", "HTTP_IF_NONE_MATCH": etag,
+        },
+    }
+
+    def rps(request):
+        client.get(**request)
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            client.get(**request)
+        return args.requests / (time.perf_counter() - start)
+
+    cached_get_user = CachedJWTAuthentication.get_user
+    print(f"{'endpoint':<30} {'uncached rps':>13} {'cached rps':>11}")
+    for name, request in endpoints.items():
+        CachedJWTAuthentication.get_user = JWTAuthentication.get_user
+        uncached = rps(request)
+        CachedJWTAuthentication.get_user = cached_get_user
+        cached = rps(request)
+        print(f"{name:<30} {uncached:>13.0f} {cached:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
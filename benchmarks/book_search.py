@@ -0,0 +1,49 @@
+"""Compare FTS5 catalog search with icontains scans.
+
+    python -m benchmarks.book_search --rows 1000000
+
+Times the first page of results (and the total count the search
+paginator reports) for a few queries of different selectivity.
+"""
+import argparse
+
+from benchmarks import common
+
+QUERIES = ("dragon", "silver dra", "clara novak", "winter storm")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_arguments(parser)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    common.setup(args.database)
+
+    from django.core.management import call_command
+
+    from books.models import Book
+    from books.search import fallback_search_books, search_books
+
+    call_command("seed", books=args.rows, users=0, borrowings=0)
+    queryset = Book.objects.all()
+
+    def first_page(search, text):
+        results = search(queryset, text)
+        return results.count(), list(results[:args.page_size])
+
+    print(f"{'query':>20} {'matches':>9} {'icontains ms':>13} {'fts ms':>8}")
+    for text in QUERIES:
+        matches, _ = first_page(search_books, text)
+        scan_ms = common.measure(
+            lambda: first_page(fallback_search_books, text), args.repeat
+        )
+        fts_ms = common.measure(
+            lambda: first_page(search_books, text), args.repeat
+        )
+        print(f"{text:>20} {matches:>9} {scan_ms:>13.2f} {fts_ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Shared helpers for the standalone benchmark scripts.
+
+Benchmarks run against their own SQLite file (``bench.sqlite3`` by
+default) so they never touch the development database.
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup(database=None, migrate=True):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("NOTIFIER_BACKEND", "null")
+    os.environ.setdefault("DJANGO_ALLOWED_HOSTS", "testserver localhost")
+    os.environ["DATABASE_NAME"] = str(
+        database or BASE_DIR / "bench.sqlite3"
+    )
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    if migrate:
+        call_command("migrate", verbosity=0)
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--database",
+        help="SQLite file to benchmark against (default: bench.sqlite3)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=20,
+        help="Number of timed runs per measurement",
+    )
+
+
+def measure(func, repeat=20):
+    """Return the median wall time of `func` in milliseconds."""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
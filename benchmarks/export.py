@@ -0,0 +1,53 @@
+"""Measure time and peak memory of the streaming borrowing export.
+
+    python -m benchmarks.export --rows 1000000
+
+Seeds the borrowing table up to --rows, then drains the export generator
+for growing slices of the table. Peak memory should stay flat while the
+time grows linearly with the row count.
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_arguments(parser)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    args = parser.parse_args()
+
+    common.setup(args.database)
+
+    from django.core.management import call_command
+
+    from borrowings import exporters
+    from borrowings.models import Borrowing
+
+    call_command("seed", books=1000, users=1000, borrowings=args.rows)
+    ids = Borrowing.objects.order_by("id").values_list("id", flat=True)
+
+    print(f"{'rows':>10} {'seconds':>10} {'peak KiB':>10} {'MiB out':>10}")
+    for rows in (1_000, 10_000, 100_000, args.rows):
+        if rows > args.rows:
+            continue
+        queryset = Borrowing.objects.filter(id__lte=ids[rows - 1])
+        size = 0
+        tracemalloc.start()
+        start = time.perf_counter()
+        for chunk in exporters.export_borrowings(queryset, args.format):
+            size += len(chunk)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{rows:>10} {elapsed:>10.2f} {peak / 1024:>10.0f} "
+            f"{size / 2 ** 20:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
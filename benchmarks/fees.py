@@ -0,0 +1,68 @@
+"""Compare database-side fee totals with computing them in Python.
+
+    python -m benchmarks.fees --rows 1000000
+
+Seeds the borrowing table up to --rows and bills last month's loans per
+user, once with fees.fee_totals() and once by loading every borrowing of
+the month and adding up the fees in a loop.
+"""
+import argparse
+from collections import defaultdict
+from datetime import timedelta
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_arguments(parser)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    common.setup(args.database)
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from borrowings import fees
+    from borrowings.models import Borrowing
+
+    call_command("seed", books=1000, users=1000, borrowings=args.rows)
+    today = timezone.localdate()
+    month_end = today.replace(day=1)
+    month = Borrowing.objects.filter(
+        borrow_date__gte=(month_end - timedelta(days=1)).replace(day=1),
+        borrow_date__lt=month_end,
+    )
+
+    def in_database():
+        return fees.fee_totals(month, ["user"], today)
+
+    def in_python():
+        totals = defaultdict(int)
+        for borrowing in month.select_related("book_id"):
+            end = borrowing.actual_return_date or today
+            rental_days = max(
+                (min(end, borrowing.expected_return_date)
+                 - borrowing.borrow_date).days,
+                1,
+            )
+            overdue_days = max(
+                (end - borrowing.expected_return_date).days, 0
+            )
+            daily_fee = borrowing.book_id.daily_fee
+            totals[borrowing.user_id_id] += daily_fee * (
+                rental_days + overdue_days * settings.FINE_MULTIPLIER
+            )
+        return totals
+
+    rows = month.count()
+    repeat = max(args.repeat // 4, 1)
+    print(f"billing {rows} borrowings of one month")
+    print(f"  aggregate query  {common.measure(in_database, repeat):10.1f} ms")
+    print(f"  python loop      {common.measure(in_python, repeat):10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
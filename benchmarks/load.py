@@ -0,0 +1,243 @@
+"""Concurrency limits of the WSGI and ASGI deployments.
+
+    pip install gunicorn uvicorn
+    python -m benchmarks.load --duration 10 --clients 16 --slow-clients 0 64
+
+Starts each server against the benchmark database and holds
+`--slow-clients` connections open by sending a request one byte per
+second. Meanwhile `--clients` fast keep-alive clients read the endpoint
+as often as they can. Sync workers spend a thread on each slow client,
+so once slow clients outnumber the worker threads the fast ones queue
+behind them. Under ASGI a slow client only costs a socket.
+
+Throttling is disabled in the servers, which would otherwise answer most
+requests with 429.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import common
+
+SERVERS = {
+    "wsgi": (
+        "gunicorn library_service.wsgi --bind 127.0.0.1:{port} "
+        "--workers {workers} --threads {threads}",
+        {},
+    ),
+    "asgi, drf views": (
+        "uvicorn library_service.asgi:application --port {port} "
+        "--workers {workers} --log-level warning",
+        {"ASYNC_READ_VIEWS": "False"},
+    ),
+    "asgi, async views": (
+        "uvicorn library_service.asgi:application --port {port} "
+        "--workers {workers} --log-level warning",
+        {"ASYNC_READ_VIEWS": "True"},
+    ),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(command, env, port, args):
+    command = command.format(
+        port=port, workers=args.workers, threads=args.threads
+    )
+    process = subprocess.Popen(
+        command.split(),
+        cwd=common.BASE_DIR,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    sys.exit(f"{command} did not start")
+
+
+async def read_response(reader):
+    status_line = await reader.readuntil(b"\r\n")
+    headers = {}
+    while (line := await reader.readuntil(b"\r\n")) != b"\r\n":
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if headers.get("transfer-encoding") == "chunked":
+        while size := int(await reader.readuntil(b"\r\n"), 16):
+            await reader.readexactly(size + 2)
+        await reader.readuntil(b"\r\n")
+    else:
+        await reader.readexactly(int(headers.get("content-length", 0)))
+    return int(status_line.split()[1]), headers.get("connection") == "close"
+
+
+async def fast_client(port, request, deadline, timeout, results):
+    connection = None
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.wait_for(
+                    asyncio.open_connection("127.0.0.1", port), timeout
+                )
+            reader, writer = connection
+            writer.write(request)
+            status, close = await asyncio.wait_for(
+                read_response(reader), timeout
+            )
+        except (OSError, ValueError, asyncio.IncompleteReadError,
+                asyncio.TimeoutError):
+            results["errors"] += 1
+            status, close = None, True
+        else:
+            if status == 200:
+                results["latencies"].append(time.perf_counter() - start)
+            else:
+                results["errors"] += 1
+        if close and connection is not None:
+            connection[1].close()
+            connection = None
+
+
+async def slow_client(port, request, deadline):
+    """Keep a request in flight by sending it one byte per second."""
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for byte in request:
+                if time.perf_counter() >= deadline:
+                    break
+                writer.write(bytes([byte]))
+                await writer.drain()
+                await asyncio.sleep(1)
+            writer.close()
+        except OSError:
+            await asyncio.sleep(0.1)
+
+
+async def run_load(port, args, request, slow_clients):
+    # Connect the slow clients first so that they hold the workers
+    deadline = time.perf_counter() + args.duration + 2
+    slow = [
+        asyncio.create_task(slow_client(port, request, deadline))
+        for _ in range(slow_clients)
+    ]
+    await asyncio.sleep(2 if slow_clients else 0)
+
+    results = {"latencies": [], "errors": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        fast_client(
+            port, request, start + args.duration, args.timeout, results
+        )
+        for _ in range(args.clients)
+    ))
+    elapsed = time.perf_counter() - start
+    for task in slow:
+        task.cancel()
+    await asyncio.gather(*slow, return_exceptions=True)
+    return results, elapsed
+
+
+def report(name, slow_clients, results, elapsed):
+    latencies = sorted(results["latencies"])
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100)
+        p50, p99 = percentiles[49] * 1000, percentiles[98] * 1000
+    else:
+        p50 = p99 = float("nan")
+    print(
+        f"{name:<18} {slow_clients:>5} {len(latencies) / elapsed:>8.0f} "
+        f"{p50:>9.1f} {p99:>9.1f} {results['errors']:>7}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--database",
+        help="SQLite file to benchmark against (default: bench.sqlite3)",
+    )
+    parser.add_argument("--path", default="/api/books/")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument(
+        "--slow-clients", type=int, nargs="+", default=[0, 64]
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--threads", type=int, default=4, help="Threads per WSGI worker"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=5, help="Seconds per request"
+    )
+    parser.add_argument(
+        "--servers", nargs="+", choices=SERVERS, default=list(SERVERS)
+    )
+    args = parser.parse_args()
+
+    common.setup(args.database)
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    call_command("seed", books=1000, users=1000, borrowings=10_000)
+    user, _ = get_user_model().objects.get_or_create(
+        email="bench@library.test", defaults={"username": "bench"}
+    )
+    request = (
+        f"GET {args.path} HTTP/1.1\r\n"
+        f"Host: localhost\r\n"
+        f"Authorize: Bearer {AccessToken.for_user(user)}\r\n"
+        f"\r\n"
+    ).encode()
+
+    os.environ.update({
+        "DJANGO_ALLOWED_HOSTS": "localhost 127.0.0.1",
+        "THROTTLE_USER_RATE": "",
+        "THROTTLE_ANON_RATE": "",
+    })
+    print(
+        f"{args.clients} fast clients, {args.workers} workers, "
+        f"{args.threads} threads per WSGI worker, GET {args.path}"
+    )
+    print(
+        f"{'server':<18} {'slow':>5} {'rps':>8} {'p50 ms':>9} "
+        f"{'p99 ms':>9} {'errors':>7}"
+    )
+    for name in args.servers:
+        command, env = SERVERS[name]
+        port = free_port()
+        process = start_server(command, env, port, args)
+        try:
+            for slow_clients in args.slow_clients:
+                results, elapsed = asyncio.run(
+                    run_load(port, args, request, slow_clients)
+                )
+                report(name, slow_clients, results, elapsed)
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
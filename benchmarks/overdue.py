@@ -0,0 +1,65 @@
+"""Time the incremental overdue scanner.
+
+    python -m benchmarks.overdue --rows 1000000
+
+Seeds --rows active borrowings, due over the next two weeks or already
+overdue, into its own database (bench_overdue.sqlite3 by default), then
+times the first scan over the whole backlog and daily scans that only
+see one day of newly overdue loans.
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_arguments(parser)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    common.setup(
+        args.database or common.BASE_DIR / "bench_overdue.sqlite3"
+    )
+
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from borrowings import overdue
+    from borrowings.models import Notification, OverdueScan
+
+    call_command(
+        "seed",
+        books=1000,
+        users=1000,
+        borrowings=args.rows,
+        active_ratio=1,
+    )
+
+    def scan(today):
+        start = time.perf_counter()
+        found = overdue.scan_overdue(today=today)
+        return found, (time.perf_counter() - start) * 1000
+
+    OverdueScan.objects.all().delete()
+    Notification.objects.all().delete()
+    first_day = timezone.localdate()
+    found, elapsed = scan(first_day)
+    print(f"backlog scan: {found} overdue in {elapsed:.1f} ms")
+
+    timings = []
+    for day in range(1, args.repeat + 1):
+        found, elapsed = scan(first_day + timedelta(days=day))
+        timings.append(elapsed)
+    timings.sort()
+    print(
+        f"daily scan: ~{found} overdue, "
+        f"median {timings[len(timings) // 2]:.1f} ms, "
+        f"max {timings[-1]:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
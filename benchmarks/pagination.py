@@ -0,0 +1,68 @@
+"""Compare keyset (cursor) pagination with OFFSET pagination.
+
+    python -m benchmarks.pagination --rows 1000000
+
+Seeds the book table up to --rows, then times fetching one page at
+increasing depths through the same paginator classes the API uses.
+"""
+import argparse
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_arguments(parser)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    common.setup(args.database)
+
+    from django.core.management import call_command
+    from rest_framework.pagination import Cursor, LimitOffsetPagination
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from books.models import Book
+    from books.serializers import BookSerializer
+    from library_service.pagination import IdCursorPagination
+
+    call_command("seed", books=args.rows, users=0, borrowings=0)
+    factory = APIRequestFactory()
+    queryset = Book.objects.all()
+    ids = Book.objects.order_by("id").values_list("id", flat=True)
+
+    def fetch_offset(depth):
+        paginator = LimitOffsetPagination()
+        request = Request(factory.get(
+            "/api/books/", {"limit": args.page_size, "offset": depth}
+        ))
+        page = paginator.paginate_queryset(queryset.order_by("id"), request)
+        return BookSerializer(page, many=True).data
+
+    def fetch_cursor(cursor):
+        paginator = IdCursorPagination()
+        paginator.page_size = args.page_size
+        request = Request(factory.get("/api/books/", {"cursor": cursor}))
+        page = paginator.paginate_queryset(queryset, request)
+        return BookSerializer(page, many=True).data
+
+    print(f"{'depth':>10} {'offset ms':>10} {'cursor ms':>10}")
+    for depth in (0, 1_000, 10_000, 100_000, 500_000, args.rows - 100):
+        if depth >= args.rows or depth < 0:
+            continue
+        encoder = IdCursorPagination()
+        encoder.base_url = "/api/books/"
+        url = encoder.encode_cursor(
+            Cursor(offset=0, reverse=False, position=str(ids[depth]))
+        )
+        cursor = parse_qs(urlsplit(url).query)["cursor"][0]
+        offset_ms = common.measure(lambda: fetch_offset(depth), args.repeat)
+        cursor_ms = common.measure(lambda: fetch_cursor(cursor), args.repeat)
+        print(f"{depth:>10} {offset_ms:>10.2f} {cursor_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Latency percentiles and throughput of the main API operations.
+
+    python -m benchmarks.run --requests 500 --concurrency 4
+    python -m benchmarks.run --compare bench_results/<earlier run>.json
+
+Tops the benchmark database up with `manage.py seed` to the given
+volumes, then sends requests through the full Django stack in-process:
+    book list     GET /api/books/
+    borrow        POST /api/borrowings/ for books with copies left
+    return        POST /api/borrowings/<id>/return/ of those borrowings
+    token obtain  POST /api/user/token/ (password hashing dominates)
+
+Each operation reports p50/p95/p99 latency and requests per second. The
+results are saved as JSON, with the volumes and commit they were
+measured on, so that runs can be compared. Throttling is disabled.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmarks import common
+
+PASSWORD = "benchmark"
+
+
+def run_operation(requests, send, concurrency):
+    """Send `requests` from `concurrency` threads, each with its client.
+
+    `send(client, request)` returns whether the response was a success.
+    """
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    results = {"latencies": [], "errors": 0}
+    lock = threading.Lock()
+
+    def worker(chunk):
+        client = APIClient()
+        latencies, errors = [], 0
+        try:
+            for request in chunk:
+                start = time.perf_counter()
+                ok = send(client, request)
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+        finally:
+            connection.close()
+        with lock:
+            results["latencies"] += latencies
+            results["errors"] += errors
+
+    chunks = [requests[i::concurrency] for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(worker, chunks))
+    elapsed = time.perf_counter() - start
+
+    latencies = results["latencies"]
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100)
+        p50, p95, p99 = (percentiles[i] * 1000 for i in (49, 94, 98))
+    else:
+        p50 = p95 = p99 = latencies[0] * 1000 if latencies else None
+    return {
+        "requests": len(latencies),
+        "errors": results["errors"],
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": None if p50 is None else round(p50, 2),
+        "p95_ms": None if p95 is None else round(p95, 2),
+        "p99_ms": None if p99 is None else round(p99, 2),
+    }
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=common.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results, previous=None):
+    header = (
+        f"{'operation':<14} {'requests':>8} {'errors':>6} {'rps':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    if previous:
+        header += f" {'rps diff':>9} {'p95 diff':>9}"
+    print(header)
+    for name, result in results.items():
+        line = (
+            f"{name:<14} {result['requests']:>8} {result['errors']:>6} "
+            f"{result['rps']:>8.1f} {milliseconds(result['p50_ms']):>8} "
+            f"{milliseconds(result['p95_ms']):>8} "
+            f"{milliseconds(result['p99_ms']):>8}"
+        )
+        before = (previous or {}).get(name)
+        if before:
+            line += (
+                f" {change(before['rps'], result['rps']):>9}"
+                f" {change(before['p95_ms'], result['p95_ms']):>9}"
+            )
+        print(line)
+
+
+def milliseconds(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def change(before, after):
+    if not before or after is None:
+        return "-"
+    return f"{(after - before) / before:+.0%}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--database",
+        help="SQLite file to benchmark against (default: bench_api.sqlite3)",
+    )
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--borrowings", type=int, default=1_000_000)
+    parser.add_argument(
+        "--requests", type=int, default=500, help="Requests per operation"
+    )
+    parser.add_argument(
+        "--token-requests",
+        type=int,
+        default=50,
+        help="Requests for token obtain, which hashes a password each",
+    )
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument(
+        "--output",
+        help="Where to save the results "
+             "(default: bench_results/<timestamp>.json)",
+    )
+    parser.add_argument(
+        "--compare", help="Results of an earlier run to compare with"
+    )
+    args = parser.parse_args()
+
+    for rate in ("USER", "ANON", "BORROWING_CREATE", "TOKEN_OBTAIN"):
+        os.environ[f"THROTTLE_{rate}_RATE"] = ""
+    common.setup(args.database or common.BASE_DIR / "bench_api.sqlite3")
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.urls import reverse
+    from django.utils import timezone
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from books.models import Book
+    from borrowings.models import Borrowing
+
+    start = time.perf_counter()
+    call_command(
+        "seed",
+        books=args.books,
+        users=args.users,
+        borrowings=args.borrowings,
+    )
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+    user, _ = get_user_model().objects.get_or_create(
+        email="bench@library.test", defaults={"username": "bench"}
+    )
+    if not user.check_password(PASSWORD):
+        user.set_password(PASSWORD)
+        user.save()
+    auth = f"Bearer {AccessToken.for_user(user)}"
+    expected_return = (timezone.localdate() + timedelta(days=7)).isoformat()
+
+    book_url = reverse("book:book-list")
+    borrowing_url = reverse("borrowing:borrowing-list")
+    token_url = reverse("user:token_obtain_pair")
+    available = list(
+        Book.objects.filter(inventory__gt=0).values_list("pk", flat=True)
+    )
+    rng = random.Random(0)
+    borrowed = []
+
+    def book_list(client, _):
+        return client.get(book_url, HTTP_AUTHORIZE=auth).status_code == 200
+
+    def borrow(client, book_id):
+        response = client.post(
+            borrowing_url,
+            {"book_id": book_id, "expected_return_date": expected_return},
+            HTTP_AUTHORIZE=auth,
+        )
+        if response.status_code != 201:
+            return False
+        borrowed.append(response.json()["id"])
+        return True
+
+    def return_borrowing(client, borrowing_id):
+        return client.post(
+            reverse(
+                "borrowing:borrowing-return-borrowing", args=[borrowing_id]
+            ),
+            HTTP_AUTHORIZE=auth,
+        ).status_code == 200
+
+    def token_obtain(client, _):
+        return client.post(
+            token_url,
+            {"email": user.email, "password": PASSWORD},
+        ).status_code == 200
+
+    operations = {
+        "book list": (book_list, lambda: [None] * args.requests),
+        "borrow": (
+            borrow,
+            lambda: rng.sample(available, min(args.requests, len(available)))
+        ),
+        "return": (return_borrowing, lambda: list(borrowed)),
+        "token obtain": (token_obtain, lambda: [None] * args.token_requests),
+    }
+    results = {}
+    for name, (send, requests) in operations.items():
+        results[name] = run_operation(requests(), send, args.concurrency)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)["results"]
+    print(
+        f"{args.concurrency} thread(s), "
+        f"{Book.objects.count()} books, {Borrowing.objects.count()} "
+        f"borrowings"
+    )
+    print_report(results, previous)
+
+    output = args.output or (
+        common.BASE_DIR / "bench_results"
+        / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": commit(),
+            "concurrency": args.concurrency,
+            "volumes": {
+                "books": args.books,
+                "users": args.users,
+                "borrowings": args.borrowings,
+            },
+            "results": results,
+        }, file, indent=2)
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
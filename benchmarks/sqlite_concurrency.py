@@ -0,0 +1,203 @@
+"""Borrow/return throughput and lock errors with several processes.
+
+    python -m benchmarks.sqlite_concurrency --writers 4 --readers 4
+
+Runs the same workload against one database file with two profiles:
+    default  Django's sqlite3 backend: rollback journal, deferred BEGIN
+             and the sqlite3 module's 5 second busy timeout
+    tuned    library_service.sqlite3 with the PRAGMAs from settings
+             (WAL, synchronous=normal, ...) and BEGIN IMMEDIATE
+Writer processes borrow a random book through the borrowing serializer
+and return it, alternately through the detail serializer and the batch
+return (a read followed by writes in one transaction). Reader processes
+fetch a page of borrowings and one of books. Every process counts operations and "database is locked"
+errors.
+"""
+import argparse
+import multiprocessing
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from benchmarks import common
+
+PROFILES = ("default", "tuned")
+BOOKS = 1000
+
+
+def configure(profile, database):
+    common.setup(database, migrate=False)
+    if profile == "default":
+        from django.db import connections
+
+        connections["default"].close()
+        connections.settings["default"].update(
+            ENGINE="django.db.backends.sqlite3", OPTIONS={}
+        )
+        # Recreated from the updated settings on next use
+        del connections["default"]
+
+
+def write(index, deadline, counts):
+    from django.contrib.auth import get_user_model
+    from rest_framework.exceptions import ValidationError
+
+    from borrowings.models import Borrowing
+    from borrowings.serializers import (
+        BorrowingCreateSerializer,
+        BorrowingDetailSerializer,
+    )
+
+    request = SimpleNamespace(
+        user=get_user_model().objects.get(
+            email=f"writer{index}@library.test"
+        )
+    )
+    rng = random.Random(index)
+    expected_return_date = date.today() + timedelta(days=7)
+    while time.perf_counter() < deadline:
+        create = BorrowingCreateSerializer(
+            data={
+                "book_id": rng.randint(1, BOOKS),
+                "expected_return_date": expected_return_date,
+            },
+            context={"request": request},
+        )
+        try:
+            create.is_valid(raise_exception=True)
+            borrowing = create.save()
+            counts["ops"] += 1
+            if borrowing.pk % 2:
+                detail = BorrowingDetailSerializer(
+                    borrowing, data={}, partial=True
+                )
+                detail.is_valid(raise_exception=True)
+                detail.save()
+            else:
+                Borrowing.objects.return_borrowings(
+                    [borrowing.pk], date.today(), request.user
+                )
+            counts["ops"] += 1
+        except ValidationError:
+            counts["rejected"] += 1
+
+
+def read(index, deadline, counts):
+    from books.models import Book
+    from borrowings.models import Borrowing
+
+    while time.perf_counter() < deadline:
+        list(Borrowing.objects.order_by("-id")[:20])
+        list(Book.objects.order_by("id")[:20])
+        counts["ops"] += 1
+
+
+def worker(role, index, profile, database, duration, results):
+    configure(profile, database)
+
+    from django.db import OperationalError, connection
+
+    counts = {"ops": 0, "locked": 0, "rejected": 0}
+    deadline = time.perf_counter() + duration
+    task = write if role == "write" else read
+    while time.perf_counter() < deadline:
+        try:
+            task(index, deadline, counts)
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            counts["locked"] += 1
+    connection.close()
+    results.put((role, counts))
+
+
+def prepare(database, writers):
+    common.setup(database)
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import connection
+
+    from books.models import Book
+
+    call_command("seed", books=BOOKS, users=0, borrowings=0)
+    Book.objects.update(inventory=1_000_000)
+    for index in range(writers):
+        get_user_model().objects.get_or_create(
+            email=f"writer{index}@library.test",
+            defaults={"username": f"writer{index}"},
+        )
+    connection.close()
+
+
+def run(profile, args):
+    with sqlite3.connect(args.database) as conn:
+        conn.execute(
+            "PRAGMA journal_mode = "
+            + ("delete" if profile == "default" else "wal")
+        )
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=worker,
+            args=(role, index, profile, args.database, args.duration, results),
+        )
+        for role, count in (("write", args.writers), ("read", args.readers))
+        for index in range(count)
+    ]
+    for process in processes:
+        process.start()
+    totals = {
+        role: {"ops": 0, "locked": 0, "rejected": 0}
+        for role in ("write", "read")
+    }
+    for _ in processes:
+        role, counts = results.get()
+        for key, value in counts.items():
+            totals[role][key] += value
+    for process in processes:
+        process.join()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--database",
+        default=str(common.BASE_DIR / "bench_concurrency.sqlite3"),
+        help="SQLite file to benchmark against",
+    )
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument(
+        "--duration", type=float, default=10, help="Seconds per profile"
+    )
+    args = parser.parse_args()
+
+    prepare(args.database, args.writers)
+
+    print(
+        f"{args.writers} writer and {args.readers} reader processes, "
+        f"{args.duration:.0f} s per profile"
+    )
+    print(
+        f"{'profile':<8} {'writes/s':>9} {'reads/s':>9} "
+        f"{'write locked':>13} {'read locked':>12}"
+    )
+    for profile in PROFILES:
+        totals = run(profile, args)
+        print(
+            f"{profile:<8} "
+            f"{totals['write']['ops'] / args.duration:>9.0f} "
+            f"{totals['read']['ops'] / args.duration:>9.0f} "
+            f"{totals['write']['locked']:>13} "
+            f"{totals['read']['locked']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
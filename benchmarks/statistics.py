@@ -0,0 +1,61 @@
+"""Compare the statistics tables with counting borrowings on the fly.
+
+    python -m benchmarks.statistics --rows 1000000
+
+Seeds the borrowing table up to --rows, rebuilds the statistics tables
+with reconcile() and times a page of the most borrowed books both ways.
+"""
+import argparse
+import time
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_arguments(parser)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    common.setup(args.database)
+
+    from django.core.management import call_command
+    from django.db.models import Count, Q
+
+    from books.models import Book
+    from borrowings import stats
+    from borrowings.models import BookStatistics
+
+    call_command("seed", books=1000, users=1000, borrowings=args.rows)
+    start = time.perf_counter()
+    stats.reconcile()
+    print(f"reconcile: {time.perf_counter() - start:.1f} s")
+
+    def group_by():
+        return list(
+            Book.objects.annotate(
+                total_borrowings=Count("borrowings"),
+                active_borrowings=Count(
+                    "borrowings",
+                    filter=Q(borrowings__actual_return_date__isnull=True)
+                ),
+            ).order_by("-total_borrowings", "-id")[:20]
+        )
+
+    def statistics_table():
+        return list(
+            BookStatistics.objects.select_related("book_id").order_by(
+                "-total_borrowings", "-book_id"
+            )[:20]
+        )
+
+    print(f"most borrowed, top 20 of {args.rows} borrowings")
+    print(f"  GROUP BY          {common.measure(group_by, args.repeat):8.2f} ms")
+    print(
+        f"  statistics table  "
+        f"{common.measure(statistics_table, args.repeat):8.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
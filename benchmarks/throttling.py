@@ -0,0 +1,76 @@
+"""Per-request cost of throttling an allowed request.
+
+    python -m benchmarks.throttling --calls 200000
+
+Times the whole throttle pass DRF runs before every view,
+APIView.check_throttles(), for an authenticated user with rates high
+enough to never throttle, on a view with and without a throttle_scope.
+Each bucket store is timed, and so is the bucket update alone.
+"""
+import argparse
+import time
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_arguments(parser)
+    parser.add_argument("--calls", type=int, default=200_000)
+    args = parser.parse_args()
+
+    common.setup(args.database)
+
+    from django.conf import settings
+    from django.test import override_settings
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from rest_framework.views import APIView
+
+    from library_service.throttling import get_bucket_store
+    from user.models import User
+
+    user = User(pk=1, email="bench@library.test")
+    http_request = APIRequestFactory().get("/api/borrowings/")
+    force_authenticate(http_request, user)
+    request = Request(http_request)
+    request.user = user
+    rate = f"{args.calls * 10}/s"
+    unlimited = {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"user": rate, "borrowing_create": rate},
+    }
+    view = APIView()
+
+    def per_call_ns(call):
+        calls = range(args.calls)
+        start = time.perf_counter_ns()
+        for _ in calls:
+            call()
+        return (time.perf_counter_ns() - start) / args.calls
+
+    print(f"{'':<36} {'ns per request':>15}")
+    for backend in ("local", "cache"):
+        with override_settings(REST_FRAMEWORK=unlimited,
+                               THROTTLE_BACKEND=backend):
+            view.throttle_classes = APIView.settings.DEFAULT_THROTTLE_CLASSES
+            store = get_bucket_store()
+            timings = {}
+            for scope in (None, "borrowing_create"):
+                view.throttle_scope = scope
+                timings[scope] = per_call_ns(
+                    lambda: view.check_throttles(request)
+                )
+            consume_ns = per_call_ns(
+                lambda: store.consume(("user", 1), args.calls, args.calls)
+            )
+        print(f"{'check_throttles, ' + backend:<36} {timings[None]:>15.0f}")
+        print(
+            f"{'check_throttles, scoped, ' + backend:<36} "
+            f"{timings['borrowing_create']:>15.0f}"
+        )
+        print(f"{'bucket update only, ' + backend:<36} {consume_ns:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
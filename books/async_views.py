@@ -0,0 +1,64 @@
+from asgiref.sync import sync_to_async
+from rest_framework import status
+
+from books import cache
+from books.models import Book
+from books.permissions import IsAdminOrReadOnly
+from books.serializers import BookSerializer
+from library_service.async_views import AsyncReadView
+from library_service.pagination import IdCursorPagination
+from library_service.routers import read_from_primary
+
+
+class CachedCatalogView(AsyncReadView):
+    """Conditional GET and catalog cache of BookViewSet.
+
+    ETags and cache entries are shared with the DRF views, and misses are
+    read from the primary as well.
+    """
+    permission_classes = (IsAdminOrReadOnly,)
+
+    async def get_data(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    async def get(self, request, *args, **kwargs):
+        version = await sync_to_async(cache.get_catalog_version)()
+        etag, not_modified = self.check_etag(
+            request, (version, request.build_absolute_uri())
+        )
+        if not_modified:
+            return self.respond(None, status.HTTP_304_NOT_MODIFIED, etag)
+
+        data = await sync_to_async(cache.get_cached_data)(request)
+        if data is None:
+            with read_from_primary():
+                data = await self.get_data(request, *args, **kwargs)
+            await sync_to_async(cache.set_cached_data)(request, data)
+        return self.respond(data, etag=etag)
+
+
+class BookListView(CachedCatalogView):
+    action = "list"
+
+    def use_sync_view(self, request):
+        # Search ranks with page numbers, see BookViewSet.paginator
+        return (
+            bool(request.query_params.get("q", "").strip())
+            or super().use_sync_view(request)
+        )
+
+    async def get_data(self, request):
+        paginator = IdCursorPagination()
+        page = await paginator.apaginate_queryset(
+            Book.objects.all(), request, view=self
+        )
+        serializer = BookSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data).data
+
+
+class BookDetailView(CachedCatalogView):
+    action = "retrieve"
+
+    async def get_data(self, request, pk):
+        book = await self.get_object(Book.objects.all(), pk=pk)
+        return BookSerializer(book).data
@@ -0,0 +1,64 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from library_service import metrics, versions
+
+VERSION_KEY = "books:catalog-version"
+
+# Kept in process memory: a counter in the shared cache would cost a
+# cache write, and on the file backend a directory listing, per request
+lookups = metrics.Counter(
+    "catalog_cache_lookups_total",
+    "Catalog response cache lookups by result, hit or miss.",
+    ("result",),
+)
+
+
+def get_catalog_version():
+    return versions.get_version(VERSION_KEY)
+
+
+def bump_catalog_version():
+    versions.bump_version(VERSION_KEY)
+
+
+def invalidate_catalog():
+    """Invalidate every cached catalog response, see versions.invalidate()."""
+    versions.invalidate(VERSION_KEY)
+
+
+def response_cache_key(request):
+    url = request.build_absolute_uri()
+    digest = hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()
+    return f"books:response:{get_catalog_version()}:{digest}"
+
+
+def get_cached_data(request):
+    data = cache.get(response_cache_key(request))
+    lookups.inc("miss" if data is None else "hit")
+    return data
+
+
+def set_cached_data(request, data):
+    cache.set(
+        response_cache_key(request),
+        data,
+        timeout=settings.BOOK_CACHE_TIMEOUT
+    )
+
+
+def cache_stats():
+    """Lookups of every process writing to METRICS_DIR, or of this one."""
+    family = metrics.collect().get(lookups.name, {"values": []})
+    counts = {labels[0]: value for labels, value in family["values"]}
+    hits = counts.get("hit", 0)
+    misses = counts.get("miss", 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else None,
+        "version": get_catalog_version(),
+    }
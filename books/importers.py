@@ -0,0 +1,176 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from books.cache import invalidate_catalog
+from books.models import Book
+from books.serializers import BookSerializer
+
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+UPDATE_FIELDS = ["daily_fee", "inventory", "cover", "author", "title"]
+# Validates the optional `id` of a row, up to the largest SQLite integer
+ID_FIELD = serializers.IntegerField(min_value=1, max_value=2 ** 63 - 1)
+
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+class InvalidRow(Exception):
+    pass
+
+
+def read_csv(lines):
+    yield from csv.DictReader(lines)
+
+
+def read_ndjson(lines):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield InvalidRow(f"Invalid JSON: {e}")
+            continue
+        yield row if isinstance(row, dict) else InvalidRow(
+            "Expected a JSON object"
+        )
+
+
+READERS = {
+    "csv": read_csv,
+    "ndjson": read_ndjson,
+}
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def import_books(lines, file_format, batch_size=DEFAULT_BATCH_SIZE):
+    """Upsert books from an iterable of CSV or NDJSON text lines.
+
+    Rows are read, validated and written one batch at a time, so memory
+    use does not depend on the size of the input. A row with an `id`
+    updates that book; otherwise a book with the same title and author
+    is updated, or a new one is created. Invalid rows are reported by
+    their 1-based row number and do not stop the import.
+    """
+    report = ImportReport()
+    rows = enumerate(READERS[file_format](lines), start=1)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        import_batch(batch, report)
+    return report
+
+
+def import_batch(batch, report):
+    # One serializer validates every row of the batch, so its fields are
+    # only built once.
+    serializer = BookSerializer()
+    valid = []
+    for row_number, row in batch:
+        if isinstance(row, InvalidRow):
+            report.add_error(row_number, {"row": [str(row)]})
+            continue
+        try:
+            book_id = row.get("id")
+            if book_id in (None, ""):
+                book_id = None
+            else:
+                book_id = ID_FIELD.run_validation(book_id)
+        except ValidationError as e:
+            report.add_error(row_number, {"id": e.detail})
+            continue
+        try:
+            data = serializer.run_validation(row)
+        except ValidationError as e:
+            report.add_error(row_number, e.detail)
+        else:
+            valid.append((row_number, book_id, data))
+
+    by_id = Book.objects.in_bulk(
+        [book_id for _, book_id, _ in valid if book_id]
+    )
+    by_key = {
+        (book.title, book.author): book
+        for book in Book.objects.filter(
+            title__in={data["title"] for _, book_id, data in valid
+                       if not book_id}
+        )
+    }
+
+    to_create, to_update = {}, {}
+    for row_number, book_id, data in valid:
+        if book_id:
+            book = by_id.get(book_id)
+            if book is None:
+                report.add_error(row_number, {"id": ["Book not found."]})
+                continue
+        else:
+            key = (data["title"], data["author"])
+            book = by_key.get(key) or to_create.get(key)
+            if book is None:
+                to_create[key] = Book(**data)
+                continue
+        for field, value in data.items():
+            setattr(book, field, value)
+        if book.pk:
+            to_update[book.pk] = book
+
+    with transaction.atomic():
+        Book.objects.bulk_create(to_create.values())
+        update_books(to_update.values())
+        if to_create or to_update:
+            invalidate_catalog()
+
+    report.created += len(to_create)
+    report.updated += len(to_update)
+
+
+def update_books(books):
+    """Write changed books in one statement where the backend allows it.
+
+    INSERT ... ON CONFLICT (id) DO UPDATE is far cheaper than the
+    CASE WHEN expressions bulk_update builds for every field and row.
+    """
+    if not books:
+        return
+    if connection.features.supports_update_conflicts_with_target:
+        Book.objects.bulk_create(
+            books,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=UPDATE_FIELDS,
+        )
+    else:
+        Book.objects.bulk_update(books, UPDATE_FIELDS)
@@ -0,0 +1,52 @@
+import json
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books import importers
+
+
+class Command(BaseCommand):
+    help = "Upsert books from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, - for stdin")
+        parser.add_argument(
+            "--format",
+            choices=sorted(importers.READERS),
+            help="Input format (default: from the file extension)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=importers.DEFAULT_BATCH_SIZE,
+            help="Rows validated and written per batch",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or {
+            ".csv": "csv",
+            ".ndjson": "ndjson",
+            ".jsonl": "ndjson",
+        }.get(Path(path).suffix.lower())
+        if file_format is None:
+            raise CommandError("Cannot detect the format, use --format")
+
+        if path == "-":
+            report = importers.import_books(
+                sys.stdin, file_format, options["batch_size"]
+            )
+        else:
+            with open(path, newline="", encoding="utf-8") as lines:
+                report = importers.import_books(
+                    lines, file_format, options["batch_size"]
+                )
+
+        for error in report.errors:
+            self.stderr.write(json.dumps(error))
+        self.stdout.write(
+            f"Created {report.created}, updated {report.updated}, "
+            f"{report.error_count} invalid rows"
+        )
@@ -1,4 +1,48 @@
 from django.db import models
+from django.db.models import Case, F, Value, When
+
+from books.cache import invalidate_catalog
+
+
+class BookManager(models.Manager):
+    """Atomic inventory accounting for borrow and return."""
+
+    def take_copy(self, book_id):
+        """Decrease inventory by one if a copy is available.
+
+        Returns True when a copy was taken, False when none is left.
+        """
+        taken = self.filter(pk=book_id, inventory__gt=0).update(
+            inventory=F("inventory") - 1
+        )
+        if taken:
+            invalidate_catalog()
+        return bool(taken)
+
+    def return_copies(self, book_id, count=1):
+        """Increase inventory of the book by the given number of copies."""
+        returned = self.filter(pk=book_id).update(
+            inventory=F("inventory") + count
+        )
+        invalidate_catalog()
+        return returned
+
+    def return_copies_grouped(self, counts):
+        """Restore inventory of several books with one UPDATE.
+
+        `counts` maps book ids to the number of returned copies.
+        """
+        if not counts:
+            return 0
+        returned = self.filter(pk__in=counts).update(
+            inventory=F("inventory") + Case(
+                *(When(pk=pk, then=Value(count))
+                  for pk, count in counts.items()),
+                output_field=models.IntegerField(),
+            )
+        )
+        invalidate_catalog()
+        return returned
 
 
 class Book(models.Model):
@@ -21,6 +65,8 @@ class Book(models.Model):
     author = models.CharField(max_length=255, help_text="Author of the book")
     title = models.CharField(max_length=255, help_text="Title of the book")
 
+    objects = BookManager()
+
     class Meta:
         verbose_name = "Book"
         verbose_name_plural = "Books"
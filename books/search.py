@@ -0,0 +1,47 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+FTS_TABLE = "books_book_fts"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query matching every term as a prefix.
+
+    Terms are quoted, so FTS5 operators typed by the client are treated
+    as plain words.
+    """
+    return " ".join(f'"{token}"*' for token in TOKEN_RE.findall(text))
+
+
+def search_books(queryset, text):
+    """Filter a Book queryset by title and author, best matches first.
+
+    SQLite uses the FTS5 index kept in sync by triggers (see migration
+    books.0002_book_search); other backends fall back to icontains.
+    """
+    if connection.vendor != "sqlite":
+        return fallback_search_books(queryset, text)
+
+    match = build_match_query(text)
+    if not match:
+        return queryset.none()
+
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {table}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+        select={"search_rank": f"{FTS_TABLE}.rank"},
+    ).order_by("search_rank", "id")
+
+
+def fallback_search_books(queryset, text):
+    for token in TOKEN_RE.findall(text):
+        queryset = queryset.filter(
+            Q(title__icontains=token) | Q(author__icontains=token)
+        )
+    return queryset.order_by("id")
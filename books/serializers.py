@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 
 from books.models import Book
@@ -14,3 +16,7 @@ class BookSerializer(serializers.ModelSerializer):
             "author",
             "title",
         ]
+        extra_kwargs = {
+            "inventory": {"min_value": 0},
+            "daily_fee": {"min_value": Decimal("0")},
+        }
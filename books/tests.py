@@ -1,13 +1,41 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from rest_framework import status
-from rest_framework.test import APIClient
 
+from books.async_views import BookDetailView, BookListView
+from books.cache import cache_stats, lookups as cache_lookups
 from books.models import Book
 from books.serializers import BookSerializer
+from library_service.middleware import ASYNC_URLCONF
+from library_service.testing import AsyncQueryBudgetClient, QueryBudgetClient
 
 BOOK_URL = reverse("book:book-list")
+CACHE_STATS_URL = reverse("book:book-cache-stats")
+BULK_URL = reverse("book:book-bulk-import")
+
+QUERY_BUDGETS = {
+    "GET book:book-list": 2,
+    "POST book:book-list": 1,
+    "GET book:book-detail": 1,
+    "PUT book:book-detail": 2,
+    "DELETE book:book-detail": 4,
+    "GET book:book-cache-stats": 0,
+    "POST book:book-bulk-import": 5,
+    # Native async views, answering GET under ASGI
+    "GET books.async_views.BookListView": 2,
+    "GET books.async_views.BookDetailView": 1,
+}
 
 
 def sample_book(**params):
@@ -29,21 +57,327 @@ def detail_url(book_id: int):
 
 class UnauthenticatedBookApiTests(TestCase):
     def setUp(self):
-        self.client = APIClient()
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
 
     def test_list_books(self):
         sample_book()
         sample_book()
         res = self.client.get(BOOK_URL)
-        books = Book.objects.all()
+        books = Book.objects.order_by("id")
         serializer = BookSerializer(books, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
+
+    def test_list_books_is_cursor_paginated(self):
+        books = [sample_book(title=f"Book {i}") for i in range(5)]
+
+        res = self.client.get(BOOK_URL, {"page_size": 2})
+        self.assertEqual(
+            [book["id"] for book in res.data["results"]],
+            [books[0].id, books[1].id]
+        )
+        self.assertIsNone(res.data["previous"])
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual(
+            [book["id"] for book in res.data["results"]],
+            [books[2].id, books[3].id]
+        )
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual(
+            [book["id"] for book in res.data["results"]], [books[4].id]
+        )
+        self.assertIsNone(res.data["next"])
+
+
+class BookSearchApiTests(TestCase):
+    def setUp(self):
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+
+    def search(self, query, **params):
+        res = self.client.get(BOOK_URL, {"q": query, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def titles(self, res):
+        return [book["title"] for book in res.data["results"]]
+
+    def test_search_matches_title_and_author(self):
+        sample_book(title="The Hobbit", author="J. R. R. Tolkien")
+        sample_book(title="Dune", author="Frank Herbert")
+
+        self.assertEqual(self.titles(self.search("hobbit")), ["The Hobbit"])
+        self.assertEqual(self.titles(self.search("herbert")), ["Dune"])
+
+    def test_search_matches_word_prefixes(self):
+        sample_book(title="The Hobbit", author="J. R. R. Tolkien")
+        sample_book(title="Dune", author="Frank Herbert")
+
+        self.assertEqual(self.titles(self.search("tolk hob")), ["The Hobbit"])
+
+    def test_search_ranks_better_matches_first(self):
+        sample_book(title="A history of ships", author="Anonymous")
+        sample_book(title="Ships, ships and more ships", author="Ships")
+
+        self.assertEqual(
+            self.titles(self.search("ships")),
+            ["Ships, ships and more ships", "A history of ships"]
+        )
+
+    def test_search_index_follows_book_writes(self):
+        book = sample_book(title="Old title")
+        book.title = "New title"
+        book.save()
+
+        self.assertEqual(self.titles(self.search("old")), [])
+        self.assertEqual(self.titles(self.search("new")), ["New title"])
+
+        book.delete()
+        self.assertEqual(self.titles(self.search("new")), [])
+
+    def test_search_results_are_paginated(self):
+        for i in range(3):
+            sample_book(title=f"Atlas {i}")
+
+        res = self.search("atlas", page_size=2)
+
+        self.assertEqual(res.data["count"], 3)
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertIsNotNone(res.data["next"])
+
+    def test_search_ignores_query_syntax(self):
+        sample_book(title="Dune")
+
+        self.assertEqual(self.titles(self.search('"dune* -(')), ["Dune"])
+        self.assertEqual(self.titles(self.search("!!!")), [])
+
+
+class BookCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_lookups.values.clear()
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        self.book = sample_book(inventory=3)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        self.client.get(BOOK_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(BOOK_URL)
+
+        self.assertEqual(res.data["results"][0]["id"], self.book.id)
+        self.assertEqual(cache_stats()["hits"], 1)
+        self.assertEqual(cache_stats()["misses"], 1)
+        self.assertEqual(
+            cache_lookups.values, {("miss",): 1, ("hit",): 1}
+        )
+
+    def test_detail_is_cached_per_url(self):
+        other = sample_book(title="Other")
+        self.client.get(detail_url(self.book.id))
+
+        res = self.client.get(detail_url(other.id))
+
+        self.assertEqual(res.data["title"], "Other")
+        self.assertEqual(cache_stats()["misses"], 2)
+
+    def test_book_write_invalidates_cache(self):
+        self.client.get(detail_url(self.book.id))
+        self.book.title = "Renamed"
+        self.book.save()
+
+        res = self.client.get(detail_url(self.book.id))
+
+        self.assertEqual(res.data["title"], "Renamed")
+
+    def test_inventory_update_invalidates_cache(self):
+        self.client.get(detail_url(self.book.id))
+        Book.objects.take_copy(self.book.id)
+
+        res = self.client.get(detail_url(self.book.id))
+
+        self.assertEqual(res.data["inventory"], 2)
+
+    def test_cache_stats_admin_only(self):
+        res = self.client.get(CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        admin = get_user_model().objects.create_user(
+            "admin@admin.com",
+            "password",
+            is_staff=True
+        )
+        self.client.force_authenticate(admin)
+        self.client.get(BOOK_URL)
+        self.client.get(BOOK_URL)
+
+        res = self.client.get(CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["hit_rate"], 0.5)
+
+
+class BookConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        self.book = sample_book()
+
+    def test_matching_etag_returns_not_modified(self):
+        for url in (BOOK_URL, detail_url(self.book.id)):
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+
+                with self.assertNumQueries(0):
+                    res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+                self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(res["ETag"], etag)
+
+    def test_book_write_changes_etag(self):
+        etag = self.client.get(BOOK_URL)["ETag"]
+        Book.objects.take_copy(self.book.id)
+
+        res = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_etag_differs_per_page(self):
+        self.assertNotEqual(
+            self.client.get(BOOK_URL)["ETag"],
+            self.client.get(BOOK_URL, {"page_size": 1})["ETag"]
+        )
+
+
+class QueryStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        sample_book()
+
+    def test_server_timing_reports_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(BOOK_URL)
+
+        self.assertRegex(
+            res["Server-Timing"],
+            rf'^db;dur=[\d.]+;desc="{len(queries)} queries", '
+            rf"db-slowest;dur=[\d.]+$"
+        )
+
+    @override_settings(SQL_SLOW_REQUEST_MS=0)
+    def test_slow_request_logged_as_warning(self):
+        with self.assertLogs("library_service.sql", "WARNING") as logs:
+            self.client.get(BOOK_URL)
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(
+            (line["method"], line["path"], line["status"]),
+            ("GET", BOOK_URL, status.HTTP_200_OK)
+        )
+        self.assertGreater(line["queries"], 0)
+        self.assertIn("books_book", line["slowest_sql"])
+
+    def test_query_budget_fails_requests_over_budget(self):
+        over_budget = QueryBudgetClient({"GET book:book-list": 0})
+        without_budget = QueryBudgetClient({})
+
+        with self.assertRaisesMessage(
+                AssertionError, "GET book:book-list ran"
+        ):
+            over_budget.get(BOOK_URL)
+        with self.assertRaisesMessage(
+                AssertionError, "No query budget for GET book:book-list"
+        ):
+            without_budget.get(BOOK_URL)
+
+
+class AsyncBookApiTests(TestCase):
+    """GET under ASGI, served by books.async_views.
+
+    DRF views always send an Allow header, the async views never do.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        self.async_client = AsyncQueryBudgetClient(QUERY_BUDGETS)
+        self.books = [sample_book(title=f"Book {i}") for i in range(3)]
+
+    def test_async_urlconf_routes_hot_reads(self):
+        self.assertIs(
+            resolve(BOOK_URL, urlconf=ASYNC_URLCONF).func.view_class,
+            BookListView
+        )
+        self.assertIs(
+            resolve(
+                detail_url(self.books[0].id), urlconf=ASYNC_URLCONF
+            ).func.view_class,
+            BookDetailView
+        )
+
+    @override_settings(BOOK_CACHE_TIMEOUT=0)
+    async def test_list_matches_drf_view(self):
+        res = await self.async_client.get(BOOK_URL, {"page_size": 2})
+        expected = await sync_to_async(self.client.get)(
+            BOOK_URL, {"page_size": 2}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Allow", res)
+        self.assertEqual(res.json(), expected.json())
+        self.assertEqual(res["ETag"], expected["ETag"])
+
+        res = await self.async_client.get(res.json()["next"])
+        self.assertEqual(
+            [book["id"] for book in res.json()["results"]],
+            [self.books[2].id]
+        )
+
+    async def test_detail(self):
+        book = self.books[0]
+        res = await self.async_client.get(detail_url(book.id))
+        missing = await self.async_client.get(detail_url(book.id + 100))
+        expected = await sync_to_async(self.client.get)(
+            detail_url(book.id + 100)
+        )
+
+        self.assertNotIn("Allow", res)
+        self.assertEqual(res.json(), BookSerializer(book).data)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(missing.json(), expected.json())
+
+    async def test_matching_etag_returns_not_modified(self):
+        etag = (await self.async_client.get(BOOK_URL))["ETag"]
+
+        res = await self.async_client.get(
+            BOOK_URL, headers={"If-None-Match": etag}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+
+    async def test_search_and_html_are_served_by_drf(self):
+        search = await self.async_client.get(BOOK_URL, {"q": "book"})
+        html = await self.async_client.get(
+            BOOK_URL, headers={"Accept": "text/html"}
+        )
+
+        self.assertIn("Allow", search)
+        self.assertEqual(len(search.json()["results"]), 3)
+        self.assertIn("Allow", html)
+        self.assertTrue(html["Content-Type"].startswith("text/html"))
+
+    @override_settings(ASYNC_READ_VIEWS=False)
+    async def test_async_views_can_be_disabled(self):
+        res = await self.async_client.get(BOOK_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("Allow", res)
 
 
 class AuthenticatedBookApiTests(TestCase):
     def setUp(self):
-        self.client = APIClient()
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
         self.user = get_user_model().objects.create_user(
             "test@test.com",
             "password",
@@ -91,7 +425,7 @@ class AuthenticatedBookApiTests(TestCase):
 
 class AdminBookApiTests(TestCase):
     def setUp(self):
-        self.client = APIClient()
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
         self.user = get_user_model().objects.create_user(
             "admin@admin.com",
             "password",
@@ -129,3 +463,116 @@ class AdminBookApiTests(TestCase):
         book_url = detail_url(book.id)
         res = self.client.delete(book_url)
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class BookBulkImportTests(TestCase):
+    CSV = (
+        "title,author,cover,inventory,daily_fee\n"
+        "Dune,Frank Herbert,1,3,1.50\n"
+        "Broken,Nobody,9,-1,abc\n"
+        "Emma,Jane Austen,2,1,0.75\n"
+    )
+
+    def setUp(self):
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                "admin@admin.com",
+                "password",
+                is_staff=True
+            )
+        )
+
+    def post(self, body, content_type):
+        return self.client.generic(
+            "POST", BULK_URL, body, content_type=content_type
+        )
+
+    def test_csv_import_reports_invalid_rows(self):
+        res = self.post(self.CSV, "text/csv")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(res.data["error_count"], 1)
+        self.assertEqual(res.data["errors"][0]["row"], 2)
+        self.assertEqual(
+            set(res.data["errors"][0]["errors"]),
+            {"cover", "inventory", "daily_fee"}
+        )
+        self.assertEqual(
+            sorted(Book.objects.values_list("title", flat=True)),
+            ["Dune", "Emma"]
+        )
+
+    def test_ndjson_import_upserts_by_id_and_title_author(self):
+        dune = sample_book(title="Dune", author="Frank Herbert", inventory=1)
+        other = sample_book(title="Other")
+        body = (
+            '{"title": "Dune", "author": "Frank Herbert", "cover": "2", '
+            '"inventory": 7, "daily_fee": "2.00"}\n'
+            f'{{"id": {other.id}, "title": "Renamed", "author": "A", '
+            '"cover": "1", "inventory": 1, "daily_fee": "1.00"}\n'
+            "not json\n"
+            '{"id": 999999, "title": "Ghost", "author": "A", "cover": "1", '
+            '"inventory": 1, "daily_fee": "1.00"}\n'
+        )
+
+        res = self.post(body, "application/x-ndjson")
+
+        self.assertEqual(res.data["created"], 0)
+        self.assertEqual(res.data["updated"], 2)
+        self.assertEqual(
+            [error["row"] for error in res.data["errors"]], [3, 4]
+        )
+        dune.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(dune.inventory, 7)
+        self.assertEqual(other.title, "Renamed")
+
+    def test_invalid_ids_are_reported_per_row(self):
+        body = "id,title,author,cover,inventory,daily_fee\n" + "".join(
+            f"{book_id},Title,Author,1,1,1.00\n"
+            for book_id in ("abc", "1.5", "0", str(2 ** 70), "")
+        )
+
+        res = self.post(body, "text/csv")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 1)
+        self.assertEqual(
+            [error["row"] for error in res.data["errors"]], [1, 2, 3, 4]
+        )
+        self.assertEqual(
+            {tuple(error["errors"]) for error in res.data["errors"]},
+            {("id",)}
+        )
+
+    def test_import_writes_in_batches(self):
+        rows = "".join(
+            f"Title {i},Author,1,1,1.00\n" for i in range(25)
+        )
+        with tempfile.NamedTemporaryFile(
+                "w", suffix=".csv", delete=False
+        ) as file:
+            file.write("title,author,cover,inventory,daily_fee\n" + rows)
+        self.addCleanup(os.remove, file.name)
+        out = StringIO()
+
+        with self.assertNumQueries(3 * 4):
+            call_command("import_books", file.name, batch_size=10, stdout=out)
+
+        self.assertEqual(Book.objects.count(), 25)
+        self.assertIn("Created 25", out.getvalue())
+
+    def test_unsupported_content_type(self):
+        res = self.post("{}", "application/xml")
+        self.assertEqual(
+            res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
+
+    def test_bulk_import_admin_only(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("user@user.com", "password")
+        )
+        res = self.post(self.CSV, "text/csv")
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -1,11 +1,118 @@
-from rest_framework import viewsets
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import UnsupportedMediaType
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 
+from books import cache, importers
 from books.models import Book
+from books.search import search_books
 from books.serializers import BookSerializer
 from books.permissions import IsAdminOrReadOnly
+from library_service.conditional import ConditionalGetMixin
+from library_service.pagination import SearchPagination
+from library_service.routers import read_from_primary
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class CachedCatalogMixin:
+    """Serve list and retrieve from the versioned catalog cache.
+
+    Misses are read from the primary, as the data is cached under the
+    current catalog version for every later request.
+    """
+
+    def cached_response(self, handler, *args, **kwargs):
+        data = cache.get_cached_data(self.request)
+        if data is not None:
+            return Response(data)
+
+        with read_from_primary():
+            response = handler(self.request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set_cached_data(self.request, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, *args, **kwargs)
+
+
+class BookViewSet(
+    ConditionalGetMixin,
+    CachedCatalogMixin,
+    viewsets.ModelViewSet
+):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = (IsAdminOrReadOnly,)
+
+    @property
+    def search_query(self):
+        if self.action != "list":
+            return ""
+        return self.request.query_params.get("q", "").strip()
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.search_query:
+            self._paginator = SearchPagination()
+        return super().paginator
+
+    def get_list_etag(self, request):
+        return cache.get_catalog_version(), request.build_absolute_uri()
+
+    get_detail_etag = get_list_etag
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.search_query:
+            queryset = search_books(queryset, self.search_query)
+        return queryset
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "q",
+                type=OpenApiTypes.STR,
+                description="Search by title and author, best matches first; "
+                            "words match as prefixes (ex. ?q=tolk hobb)",
+            ),
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="cache-stats",
+        permission_classes=[IsAdminUser]
+    )
+    def cache_stats(self, request):
+        """Hit and miss counters of the catalog response cache"""
+        return Response(cache.cache_stats())
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk",
+        permission_classes=[IsAdminUser]
+    )
+    def bulk_import(self, request):
+        """Upsert books from a CSV (text/csv) or NDJSON
+        (application/x-ndjson) request body, reporting invalid rows"""
+        content_type = request.content_type.split(";")[0].strip()
+        file_format = importers.CONTENT_TYPES.get(content_type)
+        if file_format is None:
+            raise UnsupportedMediaType(content_type)
+
+        lines = (
+            line.decode(request.encoding or "utf-8")
+            for line in request.stream or ()
+        )
+        report = importers.import_books(lines, file_format)
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
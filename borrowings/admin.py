@@ -1,6 +1,11 @@
 from django.contrib import admin
 
-from borrowings.models import Borrowing
+from borrowings.models import (
+    BookStatistics,
+    Borrowing,
+    Notification,
+    UserStatistics,
+)
 
 
 @admin.register(Borrowing)
@@ -12,6 +17,7 @@ class BorrowingAdmin(admin.ModelAdmin):
         "get_book_title",
         "get_user_username"
     )
+    list_select_related = ("book_id", "user_id")
 
     def get_book_title(self, obj):
         return obj.book_id.title
@@ -23,3 +29,31 @@ class BorrowingAdmin(admin.ModelAdmin):
 
     search_fields = ("id", "user_id__email", "book_id__title")
     ordering = ("-borrow_date", "actual_return_date")
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "created_at",
+        "sent_at"
+    )
+    list_filter = ("status",)
+    ordering = ("-created_at",)
+
+
+@admin.register(BookStatistics)
+class BookStatisticsAdmin(admin.ModelAdmin):
+    list_display = ("book_id", "total_borrowings", "active_borrowings")
+    list_select_related = ("book_id",)
+    ordering = ("-total_borrowings",)
+
+
+@admin.register(UserStatistics)
+class UserStatisticsAdmin(admin.ModelAdmin):
+    list_display = ("user_id", "total_borrowings", "active_borrowings")
+    list_select_related = ("user_id",)
+    ordering = ("-active_borrowings",)
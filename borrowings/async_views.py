@@ -0,0 +1,67 @@
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from borrowings import fees
+from borrowings.cache import get_borrowings_version
+from borrowings.serializers import (
+    BorrowingDetailSerializer,
+    BorrowingSerializer,
+)
+from borrowings.views import (
+    BorrowingViewSet,
+    detail_etag_parts,
+    filter_visible,
+    list_etag_parts,
+)
+from library_service.async_views import AsyncReadView
+from library_service.pagination import NewestFirstCursorPagination
+
+
+class BorrowingReadView(AsyncReadView):
+    permission_classes = (IsAuthenticated,)
+    etag_vary = BorrowingViewSet.etag_vary
+
+    def get_queryset(self):
+        return filter_visible(self.request, BorrowingViewSet.queryset.all())
+
+
+class BorrowingListView(BorrowingReadView):
+    action = "list"
+
+    async def get(self, request):
+        queryset = self.get_queryset()
+        version = await sync_to_async(get_borrowings_version)()
+        etag, not_modified = self.check_etag(
+            request, list_etag_parts(request, version)
+        )
+        if not_modified:
+            return self.respond(None, status.HTTP_304_NOT_MODIFIED, etag)
+
+        paginator = NewestFirstCursorPagination()
+        page = await paginator.apaginate_queryset(
+            queryset, request, view=self
+        )
+        serializer = BorrowingSerializer(page, many=True)
+        return self.respond(
+            paginator.get_paginated_response(serializer.data).data,
+            etag=etag
+        )
+
+
+class BorrowingDetailView(BorrowingReadView):
+    action = "retrieve"
+
+    async def get(self, request, pk):
+        borrowing = await self.get_object(
+            fees.annotate_fees(self.get_queryset()), pk=pk
+        )
+        etag, not_modified = self.check_etag(
+            request, detail_etag_parts(borrowing)
+        )
+        if not_modified:
+            return self.respond(None, status.HTTP_304_NOT_MODIFIED, etag)
+
+        return self.respond(
+            BorrowingDetailSerializer(borrowing).data, etag=etag
+        )
@@ -0,0 +1,12 @@
+from library_service import versions
+
+VERSION_KEY = "borrowings:version"
+
+
+def get_borrowings_version():
+    return versions.get_version(VERSION_KEY)
+
+
+def invalidate_borrowings():
+    """Change the ETags of all borrowing lists, see versions.invalidate()."""
+    versions.invalidate(VERSION_KEY)
@@ -0,0 +1,89 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+COLUMNS = (
+    ("id", "id"),
+    ("borrow_date", "borrow_date"),
+    ("expected_return_date", "expected_return_date"),
+    ("actual_return_date", "actual_return_date"),
+    ("book_id", "book_id"),
+    ("book_title", "book_id__title"),
+    ("user_id", "user_id"),
+    ("user_email", "user_id__email"),
+)
+
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def filter_borrowings(queryset, borrowed_from=None, borrowed_to=None,
+                      user_id=None):
+    if borrowed_from:
+        queryset = queryset.filter(borrow_date__gte=borrowed_from)
+    if borrowed_to:
+        queryset = queryset.filter(borrow_date__lte=borrowed_to)
+    if user_id:
+        queryset = queryset.filter(user_id=user_id)
+    return queryset
+
+
+def iter_rows(queryset):
+    """Stream borrowing rows as tuples without caching them.
+
+    values_list() skips model instances, and iterator() fetches rows from
+    the cursor CHUNK_SIZE at a time instead of loading the whole result.
+    """
+    return queryset.order_by("id").values_list(
+        *(lookup for _, lookup in COLUMNS)
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+class Echo:
+    """File-like object that returns what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows):
+    names = [name for name, _ in COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), default=str) + "\n"
+
+
+RENDERERS = {
+    "csv": iter_csv,
+    "ndjson": iter_ndjson,
+}
+
+
+def export_borrowings(queryset, file_format):
+    return RENDERERS[file_format](iter_rows(queryset))
+
+
+async def aexport_borrowings(queryset, file_format, batch_size=CHUNK_SIZE):
+    """export_borrowings() as an async iterator, for ASGI.
+
+    Django 4.2's ASGI handler reads a synchronous streaming iterator into
+    a list before sending any of it. An async iterator is sent as it is
+    produced, so memory stays flat. The rows are still read in a thread,
+    `batch_size` lines per trip.
+    """
+    lines = export_borrowings(queryset, file_format)
+    next_batch = sync_to_async(lambda: list(islice(lines, batch_size)))
+    while batch := await next_batch():
+        yield "".join(batch)
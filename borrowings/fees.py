@@ -0,0 +1,120 @@
+"""Rental fees and overdue fines computed by the database.
+
+A borrowing is charged daily_fee for every day from borrow_date until it
+was returned, or until today while it is still out, capped at
+expected_return_date and never less than one day. Every day past
+expected_return_date is charged daily_fee times settings.FINE_MULTIPLIER
+as a fine.
+"""
+from django.conf import settings
+from django.db.models import (
+    Count,
+    DateField,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Func,
+    IntegerField,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest, Least, TruncMonth
+from django.utils import timezone
+
+FEE_FIELDS = ("rental_fee", "fine", "total_fee")
+
+GROUPINGS = {
+    "user": "user_id",
+    "month": "month",
+}
+
+
+class DaysBetween(Func):
+    """Whole days from the second date expression to the first."""
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            function="DATEDIFF",
+            template="%(function)s(%(expressions)s)",
+            arg_joiner=", ",
+            **extra_context
+        )
+
+
+def money(expression):
+    return ExpressionWrapper(
+        expression,
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def fee_expressions(today=None):
+    today = Value(today or timezone.localdate(), output_field=DateField())
+    end_date = Coalesce("actual_return_date", today)
+    rental_days = Greatest(
+        DaysBetween(Least(end_date, "expected_return_date"), "borrow_date"),
+        Value(1),
+    )
+    overdue_days = Greatest(
+        DaysBetween(end_date, "expected_return_date"),
+        Value(0),
+    )
+    rental_fee = money(F("book_id__daily_fee") * rental_days)
+    fine = money(
+        F("book_id__daily_fee")
+        * overdue_days
+        * Value(settings.FINE_MULTIPLIER)
+    )
+    return {
+        "rental_fee": rental_fee,
+        "fine": fine,
+        "total_fee": money(rental_fee + fine),
+    }
+
+
+def annotate_fees(queryset, today=None):
+    """Annotate rental_fee, fine and total_fee on every borrowing."""
+    return queryset.annotate(**fee_expressions(today))
+
+
+def fee_totals(queryset, group_by=(), today=None):
+    """Sum fees per user and/or borrow month in a single query.
+
+    Returns a list of dicts with the grouping keys, the number of
+    borrowings and the summed fees. Without group_by the list holds one
+    row of grand totals.
+    """
+    totals = {"borrowings": Count("id")}
+    for name, expression in fee_expressions(today).items():
+        totals[name] = Coalesce(
+            Sum(expression),
+            Value(0),
+            output_field=expression.output_field
+        )
+
+    if not group_by:
+        return [queryset.aggregate(**totals)]
+
+    keys = [GROUPINGS[name] for name in group_by]
+    if "month" in keys:
+        queryset = queryset.annotate(month=TruncMonth("borrow_date"))
+    return list(
+        queryset.values(*keys).annotate(**totals).order_by(*keys)
+    )
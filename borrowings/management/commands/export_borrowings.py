@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from borrowings import exporters
+from borrowings.models import Borrowing
+
+
+class Command(BaseCommand):
+    help = "Stream the borrowing history as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=sorted(exporters.RENDERERS),
+            default="csv",
+        )
+        parser.add_argument(
+            "--output",
+            help="File to write to (default: stdout)",
+        )
+        parser.add_argument(
+            "--from",
+            dest="borrowed_from",
+            help="Only borrowings borrowed on or after this date",
+        )
+        parser.add_argument(
+            "--to",
+            dest="borrowed_to",
+            help="Only borrowings borrowed on or before this date",
+        )
+        parser.add_argument("--user", dest="user_id", type=int)
+
+    def handle(self, *args, **options):
+        queryset = exporters.filter_borrowings(
+            Borrowing.objects.all(),
+            borrowed_from=options["borrowed_from"],
+            borrowed_to=options["borrowed_to"],
+            user_id=options["user_id"],
+        )
+        chunks = exporters.export_borrowings(queryset, options["format"])
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from borrowings import stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild book and user statistics from borrowings and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report drift, do not rewrite the tables",
+        )
+
+    def handle(self, *args, **options):
+        drift = stats.reconcile(dry_run=options["dry_run"])
+        self.stdout.write(
+            "Drifted rows: {books} book(s), {users} user(s)".format(**drift)
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from borrowings import overdue
+
+
+class Command(BaseCommand):
+    help = "Send one digest of borrowings that became overdue since last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--digest-size",
+            type=int,
+            default=overdue.DEFAULT_DIGEST_SIZE,
+            help="Number of borrowings listed in the digest message",
+        )
+
+    def handle(self, *args, **options):
+        found = overdue.scan_overdue(digest_size=options["digest_size"])
+        self.stdout.write(f"Found {found} newly overdue borrowings")
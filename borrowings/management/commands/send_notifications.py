@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from borrowings import outbox
+from borrowings.notifiers import get_notifier
+
+
+class Command(BaseCommand):
+    help = "Deliver pending notifications from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=outbox.DEFAULT_BATCH_SIZE,
+            help="Number of notifications claimed per batch",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=outbox.DEFAULT_MAX_ATTEMPTS,
+            help="Attempts before a notification is marked as failed",
+        )
+        parser.add_argument(
+            "--backoff",
+            type=int,
+            default=outbox.DEFAULT_BACKOFF,
+            help="Base retry delay in seconds, doubled on every attempt",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox instead of exiting when drained",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to sleep between polls when the outbox is empty",
+        )
+
+    def handle(self, *args, **options):
+        notifier = get_notifier()
+
+        while True:
+            result = outbox.deliver_pending(
+                notifier,
+                batch_size=options["batch_size"],
+                max_attempts=options["max_attempts"],
+                backoff=options["backoff"],
+            )
+            if any(result.values()):
+                self.stdout.write(
+                    "Sent {sent}, retrying {retried}, "
+                    "failed {failed}".format(**result)
+                )
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
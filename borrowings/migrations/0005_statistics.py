@@ -0,0 +1,100 @@
+# Generated by Django 4.2.16 on 2026-10-18 03:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_statistics(apps, schema_editor):
+    Borrowing = apps.get_model("borrowings", "Borrowing")
+    for model_name, field in (
+        ("BookStatistics", "book_id"),
+        ("UserStatistics", "user_id"),
+    ):
+        model = apps.get_model("borrowings", model_name)
+        rows = (
+            Borrowing.objects.values(field)
+            .annotate(
+                total_borrowings=models.Count("id"),
+                active_borrowings=models.Count(
+                    "id", filter=models.Q(actual_return_date__isnull=True)
+                ),
+            )
+            .order_by()
+        )
+        model.objects.bulk_create(
+            [
+                model(
+                    pk=row[field],
+                    total_borrowings=row["total_borrowings"],
+                    active_borrowings=row["active_borrowings"],
+                )
+                for row in rows.iterator()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0002_book_search"),
+        ("user", "0001_initial"),
+        ("borrowings", "0004_overdue_scan"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStatistics",
+            fields=[
+                (
+                    "user_id",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="statistics",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("total_borrowings", models.PositiveIntegerField(default=0)),
+                ("active_borrowings", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "user statistics",
+                "indexes": [
+                    models.Index(
+                        fields=["-active_borrowings", "-user_id"],
+                        name="user_stats_active_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="BookStatistics",
+            fields=[
+                (
+                    "book_id",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="statistics",
+                        serialize=False,
+                        to="books.book",
+                    ),
+                ),
+                ("total_borrowings", models.PositiveIntegerField(default=0)),
+                ("active_borrowings", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "book statistics",
+                "indexes": [
+                    models.Index(
+                        fields=["-total_borrowings", "-book_id"],
+                        name="book_stats_total_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_statistics, migrations.RunPython.noop),
+    ]
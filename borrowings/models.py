@@ -1,11 +1,106 @@
+from collections import Counter
 from datetime import timedelta
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import Q, F
+from django.utils import timezone
 
 from books.models import Book
+from borrowings.cache import invalidate_borrowings
+from library_service.transaction import immediate_atomic
+
+
+class BorrowingManager(models.Manager):
+    RETURNED = "returned"
+    ALREADY_RETURNED = "already_returned"
+    NOT_FOUND = "not_found"
+
+    def return_borrowing(self, borrowing, return_date):
+        """Return one borrowing that has already been loaded.
+
+        A conditional UPDATE on actual_return_date IS NULL decides
+        concurrent returns: only the caller that flips the row restores
+        the book's copy and the statistics counters. Returns False, and
+        changes nothing, when the borrowing was already returned.
+        """
+        from borrowings import stats
+
+        with immediate_atomic():
+            returned = self.filter(
+                pk=borrowing.pk,
+                actual_return_date__isnull=True
+            ).update(actual_return_date=return_date)
+            if returned:
+                Book.objects.return_copies(borrowing.book_id_id)
+                invalidate_borrowings()
+                stats.record_returns(
+                    {borrowing.book_id_id: 1},
+                    {borrowing.user_id_id: 1}
+                )
+        return bool(returned)
+
+    def return_borrowings(self, ids, return_date, user=None):
+        """Mark borrowings as returned and restore inventory of their books.
+
+        Runs a constant number of statements whatever the number of ids:
+        one SELECT, one conditional UPDATE of the borrowings, one grouped
+        UPDATE of the books and one of each statistics table. Only
+        borrowings of `user` are touched
+        when it is given. Returns a dict mapping every requested id to
+        RETURNED, ALREADY_RETURNED or NOT_FOUND.
+        """
+        from borrowings import stats
+
+        queryset = self.filter(pk__in=ids)
+        if user is not None:
+            queryset = queryset.filter(user_id=user)
+
+        with immediate_atomic():
+            rows = list(
+                queryset.select_for_update().values_list(
+                    "id", "book_id", "user_id", "actual_return_date"
+                )
+            )
+            returning = {
+                pk: (book_id, user_id)
+                for pk, book_id, user_id, actual_return_date in rows
+                if actual_return_date is None
+            }
+            if returning:
+                self.filter(
+                    pk__in=returning,
+                    actual_return_date__isnull=True
+                ).update(actual_return_date=return_date)
+                invalidate_borrowings()
+                book_counts = Counter(
+                    book_id for book_id, _ in returning.values()
+                )
+                Book.objects.return_copies_grouped(book_counts)
+                stats.record_returns(
+                    book_counts,
+                    Counter(user_id for _, user_id in returning.values())
+                )
+
+        results = dict.fromkeys(ids, self.NOT_FOUND)
+        for pk, *_ in rows:
+            results[pk] = (
+                self.RETURNED if pk in returning else self.ALREADY_RETURNED
+            )
+        return results
+
+
+CONSTRAINT_MESSAGES = {
+    "return_date_gte_borrow_date": {
+        "expected_return_date": "Return dates cannot be earlier "
+                                "than the borrow date"
+    },
+    "expected_return_date_within_two_weeks": {
+        "expected_return_date": "Books can be borrowed for at most "
+                                "two weeks"
+    },
+}
 
 
 class Borrowing(models.Model):
@@ -23,6 +118,8 @@ class Borrowing(models.Model):
         related_name="borrowings"
     )
 
+    objects = BorrowingManager()
+
     class Meta:
         constraints = [
             models.CheckConstraint(
@@ -41,16 +138,54 @@ class Borrowing(models.Model):
                 name="expected_return_date_within_two_weeks",
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=["user_id", "-id"],
+                name="borrowing_user_idx",
+            ),
+            models.Index(
+                fields=["-id"],
+                condition=Q(actual_return_date__isnull=True),
+                name="borrowing_active_idx",
+            ),
+            models.Index(
+                fields=["user_id", "-id"],
+                condition=Q(actual_return_date__isnull=True),
+                name="borrowing_user_active_idx",
+            ),
+            models.Index(
+                fields=["-borrow_date", "actual_return_date"],
+                name="borrowing_borrow_date_idx",
+            ),
+            models.Index(
+                fields=["expected_return_date", "id"],
+                condition=Q(actual_return_date__isnull=True),
+                name="borrowing_overdue_idx",
+            ),
+        ]
 
     @staticmethod
     def validate_inventory(book, error_to_raise):
         if book.inventory <= 0:
-            raise error_to_raise(
-                {
-                    "book": f"All copies of the book '{book.title}' "
-                            f"are currently unavailable for borrowing"
-                }
-            )
+            Borrowing.raise_unavailable(book, error_to_raise)
+
+    @staticmethod
+    def raise_unavailable(book, error_to_raise):
+        raise error_to_raise(
+            {
+                "book": f"All copies of the book '{book.title}' "
+                        f"are currently unavailable for borrowing"
+            }
+        )
+
+    @staticmethod
+    def raise_constraint_error(error, error_to_raise):
+        """Re-raise an IntegrityError of a named constraint as an error
+        users can act on; anything else is re-raised unchanged."""
+        for name, message in CONSTRAINT_MESSAGES.items():
+            if name in str(error):
+                raise error_to_raise(message) from error
+        raise error
 
     def clean(self):
         if self.pk is None:
@@ -61,12 +196,134 @@ class Borrowing(models.Model):
             force_insert=False,
             force_update=False,
             using=None,
-            update_fields=None
+            update_fields=None,
+            full_validation=False
     ):
-        self.full_clean()
+        """Save without re-validating what the database enforces.
+
+        The CHECK constraints and foreign keys are enforced by the
+        database, and callers catch the IntegrityError (see
+        raise_constraint_error). Pass full_validation=True to run
+        full_clean() first. Admin forms validate through the form anyway.
+        """
+        if full_validation:
+            self.full_clean()
         return super(Borrowing, self).save(
             force_insert, force_update, using, update_fields
         )
 
     def __str__(self):
         return f"{self.book_id} borrowed by {self.user_id}"
+
+
+class NotificationManager(models.Manager):
+    def enqueue(self, message):
+        """Store a message to be delivered by the outbox worker.
+
+        Called inside the transaction that produced the event, so the
+        message is only persisted if that transaction commits.
+        """
+        return self.create(message=message)
+
+
+class Notification(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+
+    message = models.TextField()
+    status = models.CharField(
+        choices=Status.choices,
+        default=Status.PENDING,
+        max_length=10
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    objects = NotificationManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=Q(status="pending"),
+                name="notification_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Notification {self.pk} ({self.status})"
+
+
+class OverdueScan(models.Model):
+    """High-water mark of the overdue scanner, kept in a single row.
+
+    Every active borrowing due before scanned_until has already been
+    reported, so the next scan starts from there.
+    """
+    scanned_until = models.DateField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_found = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Overdue scan until {self.scanned_until}"
+
+
+class BookStatistics(models.Model):
+    """Borrowing counters of one book, kept up to date by borrow/return.
+
+    See borrowings.stats; reconcile_statistics rebuilds them from scratch.
+    """
+    book_id = models.OneToOneField(
+        Book,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="statistics"
+    )
+    total_borrowings = models.PositiveIntegerField(default=0)
+    active_borrowings = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "book statistics"
+        indexes = [
+            models.Index(
+                fields=["-total_borrowings", "-book_id"],
+                name="book_stats_total_idx",
+            ),
+        ]
+
+    @property
+    def utilization(self):
+        """Share of the book's copies that are currently borrowed."""
+        copies = self.active_borrowings + self.book_id.inventory
+        return self.active_borrowings / copies if copies else 0.0
+
+    def __str__(self):
+        return f"Statistics of {self.book_id}"
+
+
+class UserStatistics(models.Model):
+    user_id = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="statistics"
+    )
+    total_borrowings = models.PositiveIntegerField(default=0)
+    active_borrowings = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "user statistics"
+        indexes = [
+            models.Index(
+                fields=["-active_borrowings", "-user_id"],
+                name="user_stats_active_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Statistics of {self.user_id}"
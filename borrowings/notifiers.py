@@ -0,0 +1,121 @@
+import sys
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    "telegram": "borrowings.notifiers.TelegramNotifier",
+    "console": "borrowings.notifiers.ConsoleNotifier",
+    "memory": "borrowings.notifiers.InMemoryNotifier",
+    "null": "borrowings.notifiers.NullNotifier",
+}
+
+
+class BaseNotifier:
+    # Seconds one send_message() call may take; the outbox leases
+    # batches for long enough that every send of a batch can time out
+    timeout = 10
+
+    def send_message(self, text):
+        raise NotImplementedError
+
+
+class TelegramNotifier(BaseNotifier):
+    api_url = "https://api.telegram.org/bot{token}/sendMessage"
+
+    def __init__(self, token=None, chat_id=None, timeout=10):
+        self.token = token or settings.TELEGRAM_BOT_TOKEN
+        self.chat_id = chat_id or settings.TELEGRAM_CHAT_ID
+
+        if self.token is None or self.chat_id is None:
+            raise ImproperlyConfigured(
+                "TELEGRAM_BOT__TOKEN or "
+                "TELEGRAM_CHAT_ID is not set in the environment variables"
+            )
+
+        self.timeout = timeout
+        self._session = None
+
+    @property
+    def session(self):
+        """One HTTP session per notifier, so connections are kept alive."""
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+        return self._session
+
+    def send_message(self, text):
+        response = self.session.post(
+            self.api_url.format(token=self.token),
+            data={
+                "chat_id": self.chat_id,
+                "text": text,
+                "parse_mode": "markdown",
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+
+class ConsoleNotifier(BaseNotifier):
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send_message(self, text):
+        self.stream.write(f"{text}\n")
+        self.stream.flush()
+
+
+class InMemoryNotifier(BaseNotifier):
+    """Offline notifier for tests and local development.
+
+    Records delivered messages and raises for the first `fail_times`
+    calls, so throughput and retry handling can be exercised.
+    """
+
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.calls = 0
+        self.messages = []
+
+    def send_message(self, text):
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            raise ConnectionError("Notifier is unavailable")
+        self.messages.append(text)
+
+
+class NullNotifier(BaseNotifier):
+    def send_message(self, text):
+        pass
+
+
+_notifier = None
+_lock = threading.Lock()
+
+
+def get_notifier():
+    """Return the notifier configured by NOTIFIER_BACKEND.
+
+    The backend is only imported and instantiated on first use.
+    """
+    global _notifier
+    if _notifier is None:
+        with _lock:
+            if _notifier is None:
+                backend = settings.NOTIFIER_BACKEND
+                _notifier = import_string(BACKENDS.get(backend, backend))()
+    return _notifier
+
+
+def reset_notifier(**kwargs):
+    global _notifier
+    if kwargs.get("setting") in (None, "NOTIFIER_BACKEND"):
+        _notifier = None
+
+
+setting_changed.connect(reset_notifier)
@@ -0,0 +1,126 @@
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from borrowings.models import Notification
+from borrowings.notifiers import BaseNotifier
+from library_service import metrics
+from library_service.transaction import immediate_atomic
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF = 30
+MAX_BACKOFF = 3600
+# Added to the worst case of a batch, every send timing out
+LEASE_MARGIN = timedelta(minutes=1)
+
+notifier_sends = metrics.Histogram(
+    "notifier_send_duration_seconds",
+    "Time of notifier calls by outcome, ok or error.",
+    ("outcome",),
+)
+notifications = metrics.Counter(
+    "notifications_total",
+    "Delivery attempts of the outbox by result: sent, retried or failed.",
+    ("result",),
+)
+
+
+def retry_delay(attempts, backoff=DEFAULT_BACKOFF):
+    """Exponential backoff for the given number of failed attempts."""
+    return timedelta(seconds=min(backoff * 2 ** (attempts - 1), MAX_BACKOFF))
+
+
+def lease_duration(batch_size, timeout):
+    """Time a worker may need for a batch whose every send times out."""
+    return timedelta(seconds=batch_size * timeout) + LEASE_MARGIN
+
+
+def claim_batch(batch_size=DEFAULT_BATCH_SIZE, lease=None):
+    """Lease a batch of due notifications to the calling worker.
+
+    Pushing next_attempt_at past the lease keeps other workers from
+    picking the same rows while this one is talking to the notifier.
+    The lease defaults to lease_duration() of the default send timeout.
+    """
+    if lease is None:
+        lease = lease_duration(batch_size, BaseNotifier.timeout)
+    now = timezone.now()
+    with immediate_atomic():
+        queryset = Notification.objects.filter(
+            status=Notification.Status.PENDING,
+            next_attempt_at__lte=now,
+        ).order_by("next_attempt_at", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        batch = list(queryset[:batch_size])
+        Notification.objects.filter(
+            pk__in=[notification.pk for notification in batch]
+        ).update(next_attempt_at=now + lease)
+    return batch
+
+
+def deliver_pending(
+        notifier,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        backoff=DEFAULT_BACKOFF
+):
+    """Send one batch of due notifications and record the outcome.
+
+    Returns a dict with the number of sent, retried and failed messages.
+    """
+    batch = claim_batch(
+        batch_size, lease_duration(batch_size, notifier.timeout)
+    )
+    sent, failed = [], []
+
+    for notification in batch:
+        start = time.perf_counter()
+        try:
+            notifier.send_message(notification.message)
+        except Exception as e:
+            notifier_sends.observe(time.perf_counter() - start, "error")
+            notification.attempts += 1
+            notification.last_error = str(e)
+            if notification.attempts >= max_attempts:
+                notification.status = Notification.Status.FAILED
+            else:
+                notification.next_attempt_at = (
+                    timezone.now()
+                    + retry_delay(notification.attempts, backoff)
+                )
+            failed.append(notification)
+        else:
+            notifier_sends.observe(time.perf_counter() - start, "ok")
+            sent.append(notification.pk)
+
+    now = timezone.now()
+    with immediate_atomic():
+        Notification.objects.filter(pk__in=sent).update(
+            status=Notification.Status.SENT,
+            attempts=F("attempts") + 1,
+            sent_at=now,
+            last_error="",
+        )
+        Notification.objects.bulk_update(
+            failed,
+            ["status", "attempts", "next_attempt_at", "last_error"]
+        )
+
+    exhausted = sum(
+        notification.status == Notification.Status.FAILED
+        for notification in failed
+    )
+    result = {
+        "sent": len(sent),
+        "retried": len(failed) - exhausted,
+        "failed": exhausted,
+    }
+    for name, count in result.items():
+        if count:
+            notifications.inc(name, amount=count)
+    return result
@@ -0,0 +1,70 @@
+from django.utils import timezone
+
+from borrowings.models import Borrowing, Notification, OverdueScan
+from library_service.transaction import immediate_atomic
+
+DEFAULT_DIGEST_SIZE = 20
+
+
+def newly_overdue(scanned_until, today):
+    """Active borrowings that fell due since the last scan.
+
+    Both bounds are on expected_return_date, so the query is a range scan
+    of the partial borrowing_overdue_idx index.
+    """
+    queryset = Borrowing.objects.filter(
+        actual_return_date__isnull=True,
+        expected_return_date__lt=today,
+    )
+    if scanned_until is not None:
+        queryset = queryset.filter(expected_return_date__gte=scanned_until)
+    return queryset.order_by("expected_return_date", "id")
+
+
+def format_digest(borrowings, total, digest_size=DEFAULT_DIGEST_SIZE):
+    lines = [f"Overdue Borrowings: {total} newly overdue"]
+    for borrowing in borrowings[:digest_size]:
+        lines.append(
+            f"#{borrowing.pk} '{borrowing.book_id.title}' "
+            f"borrowed by {borrowing.user_id}, "
+            f"due {borrowing.expected_return_date}"
+        )
+    if total > digest_size:
+        lines.append(f"...and {total - digest_size} more")
+    return "\n".join(lines)
+
+
+def scan_overdue(today=None, digest_size=DEFAULT_DIGEST_SIZE):
+    """Report borrowings that became overdue since the previous scan.
+
+    Enqueues a single digest notification and advances the high-water
+    mark in one transaction, so a loan is reported exactly once even if
+    the job crashes or two runs overlap. Returns the number of newly
+    overdue borrowings.
+    """
+    today = today or timezone.localdate()
+
+    # SQLite ignores select_for_update(); taking the write lock up front
+    # keeps a concurrent scan from reading the old mark meanwhile.
+    with immediate_atomic():
+        state, _ = OverdueScan.objects.select_for_update().get_or_create(
+            pk=1
+        )
+        if state.scanned_until is not None and state.scanned_until >= today:
+            return 0
+
+        queryset = newly_overdue(state.scanned_until, today)
+        total = queryset.count()
+        if total:
+            borrowings = queryset.select_related(
+                "book_id", "user_id"
+            )[:digest_size]
+            Notification.objects.enqueue(
+                format_digest(list(borrowings), total, digest_size)
+            )
+
+        state.scanned_until = today
+        state.last_run_at = timezone.now()
+        state.last_found = total
+        state.save()
+    return total
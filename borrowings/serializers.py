@@ -1,8 +1,13 @@
-from django.db import transaction
+from datetime import datetime
+
+from django.db import IntegrityError
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from borrowings.models import Borrowing
+from books.models import Book
+from borrowings import stats
+from borrowings.models import BookStatistics, Borrowing, UserStatistics
+from library_service.transaction import immediate_atomic
 
 
 class BorrowingSerializer(serializers.ModelSerializer):
@@ -22,6 +27,15 @@ class BorrowingDetailSerializer(serializers.ModelSerializer):
     book_id = serializers.StringRelatedField()
     user_id = serializers.StringRelatedField()
     actual_return_date = serializers.DateField(required=False)
+    rental_fee = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+    fine = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+    total_fee = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
 
     class Meta:
         model = Borrowing
@@ -31,7 +45,10 @@ class BorrowingDetailSerializer(serializers.ModelSerializer):
             "expected_return_date",
             "actual_return_date",
             "book_id",
-            "user_id"
+            "user_id",
+            "rental_fee",
+            "fine",
+            "total_fee"
         )
         read_only_fields = (
             "id",
@@ -41,27 +58,20 @@ class BorrowingDetailSerializer(serializers.ModelSerializer):
             "user_id"
         )
 
-    def validate(self, attrs):
-        data = super(BorrowingDetailSerializer, self).validate(attrs=attrs)
-        if self.instance.actual_return_date:
-            raise serializers.ValidationError(
-                "This borrowing has already been returned."
-            )
-        return data
-
-    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.actual_return_date = validated_data.get(
+        """Return the borrowing; returning it again changes nothing.
+
+        The borrowing is only re-read when a concurrent request returned
+        it after it was loaded, so the response shows the stored date.
+        """
+        actual_return_date = validated_data.get(
             "actual_return_date",
-            instance.actual_return_date
+            datetime.now().date()
         )
-
-        instance.save()
-
-        instance.refresh_from_db()
-        book = instance.book_id
-        book.inventory += 1
-        book.save()
+        if Borrowing.objects.return_borrowing(instance, actual_return_date):
+            instance.actual_return_date = actual_return_date
+        elif instance.actual_return_date is None:
+            instance.refresh_from_db(fields=["actual_return_date"])
         return instance
 
 
@@ -79,16 +89,80 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
         Borrowing.validate_inventory(attrs["book_id"], ValidationError)
         return data
 
-    @transaction.atomic
+    @immediate_atomic(savepoint=False)
     def create(self, validated_data):
         user = self.context['request'].user
-        borrowing = Borrowing.objects.create(
-            expected_return_date=validated_data['expected_return_date'],
-            book_id=validated_data['book_id'],
-            user_id=user
-        )
+        book = validated_data["book_id"]
+        if not Book.objects.take_copy(book.pk):
+            Borrowing.raise_unavailable(book, ValidationError)
 
-        book = validated_data.get("book_id")
-        book.inventory -= 1
-        book.save()
+        try:
+            borrowing = Borrowing.objects.create(
+                expected_return_date=validated_data['expected_return_date'],
+                book_id=book,
+                user_id=user
+            )
+        except IntegrityError as e:
+            Borrowing.raise_constraint_error(e, ValidationError)
+        stats.record_borrow(book.pk, user.pk)
         return borrowing
+
+
+class BorrowingBatchReturnSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000
+    )
+
+
+class BorrowingExportSerializer(serializers.Serializer):
+    file_format = serializers.ChoiceField(
+        choices=("csv", "ndjson"),
+        default="csv"
+    )
+    borrowed_from = serializers.DateField(required=False)
+    borrowed_to = serializers.DateField(required=False)
+    user_id = serializers.IntegerField(required=False, min_value=1)
+
+
+class BorrowingFeeTotalsSerializer(serializers.Serializer):
+    group_by = serializers.MultipleChoiceField(
+        choices=("user", "month"),
+        required=False
+    )
+    borrowed_from = serializers.DateField(required=False)
+    borrowed_to = serializers.DateField(required=False)
+
+
+class BookStatisticsSerializer(serializers.ModelSerializer):
+    title = serializers.CharField(source="book_id.title", read_only=True)
+    inventory = serializers.IntegerField(
+        source="book_id.inventory",
+        read_only=True
+    )
+    utilization = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = BookStatistics
+        fields = (
+            "book_id",
+            "title",
+            "total_borrowings",
+            "active_borrowings",
+            "inventory",
+            "utilization"
+        )
+
+
+class UserStatisticsSerializer(serializers.ModelSerializer):
+    email = serializers.EmailField(source="user_id.email", read_only=True)
+
+    class Meta:
+        model = UserStatistics
+        fields = (
+            "user_id",
+            "email",
+            "total_borrowings",
+            "active_borrowings"
+        )
@@ -0,0 +1,108 @@
+"""Denormalized borrowing counters per book and per user.
+
+The counters are changed in the same transaction as the borrow or return
+that moves them, so dashboards read one row per book instead of counting
+the whole borrowing table. Borrowings written outside the API (admin,
+fixtures) are not counted; reconcile() rebuilds the tables and reports
+how far they had drifted.
+"""
+from django.db import models
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Greatest
+
+from borrowings.models import BookStatistics, Borrowing, UserStatistics
+from library_service.transaction import immediate_atomic
+
+COUNTERS = ("total_borrowings", "active_borrowings")
+
+
+def increment(model, pk):
+    """Count a new, active borrowing for one book or user."""
+    updates = {field: F(field) + 1 for field in COUNTERS}
+    if model.objects.filter(pk=pk).update(**updates):
+        return
+    _, created = model.objects.get_or_create(
+        pk=pk, defaults=dict.fromkeys(COUNTERS, 1)
+    )
+    if not created:
+        model.objects.filter(pk=pk).update(**updates)
+
+
+def record_borrow(book_id, user_id):
+    increment(BookStatistics, book_id)
+    increment(UserStatistics, user_id)
+
+
+def decrement_active(model, counts):
+    """Stop counting returned borrowings as active with one UPDATE.
+
+    `counts` maps primary keys to the number of returned borrowings.
+    Counters never go below zero, even for borrowings that were never
+    counted.
+    """
+    if not counts:
+        return
+    model.objects.filter(pk__in=counts).update(
+        active_borrowings=Greatest(
+            F("active_borrowings") - Case(
+                *(When(pk=pk, then=Value(count))
+                  for pk, count in counts.items()),
+                output_field=models.IntegerField(),
+            ),
+            Value(0),
+        )
+    )
+
+
+def record_returns(book_counts, user_counts):
+    decrement_active(BookStatistics, book_counts)
+    decrement_active(UserStatistics, user_counts)
+
+
+def actual_counts(group_field):
+    return {
+        row[group_field]: (row["total_borrowings"], row["active_borrowings"])
+        for row in Borrowing.objects.values(group_field).annotate(
+            total_borrowings=Count("id"),
+            active_borrowings=Count(
+                "id", filter=Q(actual_return_date__isnull=True)
+            ),
+        ).order_by()
+    }
+
+
+def rebuild(model, group_field, dry_run=False):
+    """Recount one statistics table and return the number of wrong rows."""
+    actual = actual_counts(group_field)
+    stored = dict(
+        (pk, (total, active))
+        for pk, total, active in model.objects.values_list("pk", *COUNTERS)
+    )
+    drift = sum(
+        actual.get(pk, (0, 0)) != stored.get(pk, (0, 0))
+        for pk in actual.keys() | stored.keys()
+    )
+    if drift and not dry_run:
+        model.objects.all().delete()
+        model.objects.bulk_create(
+            [
+                model(pk=pk, total_borrowings=total, active_borrowings=active)
+                for pk, (total, active) in actual.items()
+            ],
+            batch_size=1000,
+        )
+    return drift
+
+
+def reconcile(dry_run=False):
+    """Rebuild both tables from Borrowing and report drifted rows.
+
+    Runs in one transaction so readers never see a half-built table. It
+    takes the write lock before counting, so a borrow or return waits for
+    the rebuild instead of failing it or being overwritten by its counts.
+    """
+    with immediate_atomic():
+        return {
+            "books": rebuild(BookStatistics, "book_id", dry_run),
+            "users": rebuild(UserStatistics, "user_id", dry_run),
+        }
@@ -1,21 +1,81 @@
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+import json
+import re
+import threading
 import uuid
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.core.exceptions import ImproperlyConfigured
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
 
+from books.models import Book
 from books.tests import sample_book
-from borrowings.models import Borrowing
+from borrowings import fees, outbox, overdue, stats
+from borrowings.models import (
+    BookStatistics,
+    Borrowing,
+    Notification,
+    OverdueScan,
+    UserStatistics,
+)
 from borrowings.serializers import (
     BorrowingSerializer,
     BorrowingDetailSerializer,
 )
+from borrowings.views import BorrowingViewSet
+from borrowings.notifiers import (
+    InMemoryNotifier,
+    NullNotifier,
+    TelegramNotifier,
+    get_notifier,
+)
+from library_service.testing import AsyncQueryBudgetClient, QueryBudgetClient
 
 
 BORROWING_URL = reverse("borrowing:borrowing-list")
+BATCH_RETURN_URL = reverse("borrowing:borrowing-return-borrowings")
+EXPORT_URL = reverse("borrowing:borrowing-export")
+FEES_URL = reverse("borrowing:borrowing-fee-totals")
+BOOK_STATISTICS_URL = reverse("borrowing:bookstatistics-list")
+USER_STATISTICS_URL = reverse("borrowing:userstatistics-list")
+
+QUERY_BUDGETS = {
+    "GET borrowing:borrowing-list": 1,
+    # Borrowing a book for the first time also creates its statistics rows
+    "POST borrowing:borrowing-list": 16,
+    "GET borrowing:borrowing-detail": 1,
+    "POST borrowing:borrowing-return-borrowing": 7,
+    "POST borrowing:borrowing-return-borrowings": 7,
+    "GET borrowing:borrowing-fee-totals": 1,
+    # Authenticating the user; rows are read while the response streams
+    "GET borrowing:borrowing-export": 1,
+    "GET borrowing:bookstatistics-list": 1,
+    "GET borrowing:userstatistics-list": 1,
+    "GET admin:borrowings_borrowing_changelist": 5,
+    # Native async views, answering GET under ASGI
+    "GET borrowings.async_views.BorrowingListView": 2,
+    "GET borrowings.async_views.BorrowingDetailView": 2,
+}
 
 
 def detail_url(borrowing_id: int):
@@ -26,6 +86,19 @@ def return_url(borrowing_id: int):
     return reverse("borrowing:borrowing-return-borrowing", args=[borrowing_id])
 
 
+def statements(queries):
+    """SQL captured by CaptureQueriesContext, without savepoints."""
+    return [
+        query["sql"] for query in queries.captured_queries
+        if "SAVEPOINT" not in query["sql"]
+    ]
+
+
+def in_days(days):
+    """ISO date `days` after today, as the API expects it."""
+    return (timezone.localdate() + timedelta(days=days)).isoformat()
+
+
 def sample_user(**params):
     unique_id = uuid.uuid4()
     defaults = {
@@ -42,8 +115,8 @@ def sample_borrowing(user=None, **params):
     if user is None:
         user = sample_user()
     defaults = {
-        "borrow_date": "2025-01-02",
-        "expected_return_date": "2025-01-14",
+        "borrow_date": in_days(0),
+        "expected_return_date": in_days(7),
         "book_id": book,
         "user_id": user,
     }
@@ -54,7 +127,7 @@ def sample_borrowing(user=None, **params):
 
 class UnauthenticatedBorrowingApiTest(TestCase):
     def setUp(self):
-        self.client = APIClient()
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
 
     def test_auth_required(self):
         res = self.client.get(BORROWING_URL)
@@ -63,7 +136,7 @@ class UnauthenticatedBorrowingApiTest(TestCase):
 
 class AuthenticatedBorrowingApiTest(TestCase):
     def setUp(self):
-        self.client = APIClient()
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
         self.user = get_user_model().objects.create_user(
             "testuser@test.com",
             "password",
@@ -74,14 +147,14 @@ class AuthenticatedBorrowingApiTest(TestCase):
         book1 = sample_book()
         book2 = sample_book()
         borrowing1 = Borrowing.objects.create(
-            borrow_date="2025-01-02",
-            expected_return_date="2025-01-14",
+            borrow_date=in_days(0),
+            expected_return_date=in_days(7),
             book_id=book1,
             user_id=self.user
         )
         borrowing2 = Borrowing.objects.create(
-            borrow_date="2025-01-02",
-            expected_return_date="2025-01-14",
+            borrow_date=in_days(0),
+            expected_return_date=in_days(7),
             book_id=book2,
             user_id=self.user
         )
@@ -93,11 +166,13 @@ class AuthenticatedBorrowingApiTest(TestCase):
 
         res = self.client.get(BORROWING_URL)
 
-        borrowings = Borrowing.objects.filter(user_id=self.user)
+        borrowings = Borrowing.objects.filter(
+            user_id=self.user
+        ).order_by("-id")
         serializer = BorrowingSerializer(borrowings, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_retrieve_borrowing_detail(self):
         borrowing = sample_borrowing(user=self.user)
@@ -106,15 +181,75 @@ class AuthenticatedBorrowingApiTest(TestCase):
 
         res = self.client.get(url)
 
-        serializer = BorrowingDetailSerializer(borrowing)
+        serializer = BorrowingDetailSerializer(
+            fees.annotate_fees(Borrowing.objects.all()).get(pk=borrowing.pk)
+        )
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_list_borrowing_not_modified(self):
+        sample_borrowing(user=self.user)
+        etag = self.client.get(BORROWING_URL)["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(BORROWING_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn("Authorize", res["Vary"])
+
+    def test_list_borrowing_etag_changes_on_return(self):
+        borrowing = sample_borrowing(user=self.user)
+        etag = self.client.get(BORROWING_URL)["ETag"]
+
+        self.client.post(return_url(borrowing.id), {}, format="json")
+        res = self.client.get(BORROWING_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_list_etag_does_not_scan_borrowings(self):
+        # Staff lists filter on nothing indexed, so an aggregate for the
+        # ETag would read every borrowing on every request
+        staff = get_user_model().objects.create_user(
+            "staff@test.com", "password", is_staff=True
+        )
+        self.client.force_authenticate(staff)
+        sample_borrowing(user=self.user)
+        url = f"{BORROWING_URL}?is_active=true"
+        etag = self.client.get(url)["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            res = self.client.get(url)
+
+        self.assertEqual(
+            not_modified.status_code, status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        self.assertRegex(queries[0]["sql"], r"LIMIT \d+$")
+        self.assertNotIn("COUNT(", queries[0]["sql"])
+        self.assertNotIn("MAX(", queries[0]["sql"])
+
+        sample_borrowing()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_borrowing_not_modified(self):
+        borrowing = sample_borrowing(user=self.user)
+        url = detail_url(borrowing.id)
+        etag = self.client.get(url)["ETag"]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
     def test_create_borrowing(self):
         book = sample_book()
         payload = {
-            "expected_return_date": "2025-01-14",
+            "expected_return_date": in_days(7),
             "book_id": book.id,
         }
         res = self.client.post(BORROWING_URL, payload, format="json")
@@ -124,14 +259,38 @@ class AuthenticatedBorrowingApiTest(TestCase):
         borrowing = Borrowing.objects.get(id=res.data['id'])
         self.assertEqual(borrowing.book_id.id, book.id)
         self.assertEqual(borrowing.user_id.id, self.user.id)
-        self.assertEqual(str(borrowing.expected_return_date), "2025-01-14")
+        self.assertEqual(str(borrowing.expected_return_date), in_days(7))
+
+    def test_create_borrowing_enqueues_notification(self):
+        book = sample_book()
+        payload = {
+            "expected_return_date": in_days(7),
+            "book_id": book.id,
+        }
+        res = self.client.post(BORROWING_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.status, Notification.Status.PENDING)
+        self.assertIn(f"Borrowing ID: {res.data['id']}", notification.message)
+
+    def test_rejected_borrowing_enqueues_nothing(self):
+        book = sample_book(inventory=0)
+        payload = {
+            "expected_return_date": in_days(7),
+            "book_id": book.id,
+        }
+        res = self.client.post(BORROWING_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Notification.objects.exists())
 
     def test_create_borrowing_decrease_book_inventory_by_1(self):
         book = sample_book(inventory=5)  # Створюємо книгу з інвентарем 5
         initial_inventory = book.inventory
 
         payload = {
-            "expected_return_date": "2025-01-14",
+            "expected_return_date": in_days(7),
             "book_id": book.id,
         }
         res = self.client.post(BORROWING_URL, payload, format="json")
@@ -151,30 +310,32 @@ class AuthenticatedBorrowingApiTest(TestCase):
         book2 = sample_book()
 
         Borrowing.objects.create(
-            borrow_date="2025-01-02",
-            expected_return_date="2025-01-14",
+            borrow_date=in_days(0),
+            expected_return_date=in_days(7),
             book_id=book1,
             user_id=self.user
         )
         Borrowing.objects.create(
-            borrow_date="2025-01-02",
-            expected_return_date="2025-01-14",
+            borrow_date=in_days(0),
+            expected_return_date=in_days(7),
             book_id=book2,
             user_id=other_user
         )
 
         res = self.client.get(BORROWING_URL)
 
-        borrowings = Borrowing.objects.filter(user_id=self.user)
+        borrowings = Borrowing.objects.filter(
+            user_id=self.user
+        ).order_by("-id")
         serializer = BorrowingSerializer(borrowings, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_return_borrowing(self):
         book = sample_book()
         payload = {
-            "expected_return_date": "2025-01-14",
+            "expected_return_date": in_days(7),
             "book_id": book.id,
         }
         res = self.client.post(BORROWING_URL, payload, format="json")
@@ -189,10 +350,82 @@ class AuthenticatedBorrowingApiTest(TestCase):
         instance = Borrowing.objects.get(pk=borrowing_id)
         self.assertEqual(instance.actual_return_date, datetime.now().date())
 
+    def test_repeated_return_is_noop(self):
+        book = sample_book(inventory=3)
+        borrowing = sample_borrowing(user=self.user, book_id=book)
+
+        first = self.client.post(return_url(borrowing.id))
+        second = self.client.post(return_url(borrowing.id))
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            second.data["actual_return_date"],
+            first.data["actual_return_date"]
+        )
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 4)
+
+    def test_return_query_budget(self):
+        borrowing = sample_borrowing(user=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(return_url(borrowing.id))
+        self.assertEqual(len(statements(queries)), 5, statements(queries))
+        self.assertEqual(
+            res.data["actual_return_date"], str(datetime.now().date())
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(return_url(borrowing.id))
+        self.assertEqual(len(statements(queries)), 2, statements(queries))
+
+    def test_create_borrowing_query_budget(self):
+        book = sample_book(inventory=2)
+        payload = {
+            "expected_return_date": in_days(7),
+            "book_id": book.id,
+        }
+
+        self.client.post(BORROWING_URL, payload, format="json")
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(BORROWING_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(statements(queries)), 6, statements(queries))
+
+    def test_create_rejects_violated_constraint(self):
+        book = sample_book(inventory=2)
+        payload = {
+            "expected_return_date": in_days(30),
+            "book_id": book.id,
+        }
+
+        res = self.client.post(BORROWING_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("expected_return_date", res.data)
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 2)
+        self.assertFalse(Borrowing.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+    def test_full_validation_is_opt_in(self):
+        borrowing = Borrowing(
+            expected_return_date=in_days(7),
+            book_id=sample_book(inventory=0),
+            user_id=self.user,
+        )
+
+        with self.assertRaises(DjangoValidationError):
+            borrowing.save(full_validation=True)
+        borrowing.save()
+        self.assertIsNotNone(borrowing.pk)
+
 
 class AdminBorrowingApiTest(TestCase):
     def setUp(self):
-        self.client = APIClient()
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
         self.user = get_user_model().objects.create_user(
             "admin@admin.com",
             "password",
@@ -200,6 +433,19 @@ class AdminBorrowingApiTest(TestCase):
         )
         self.client.force_authenticate(self.user)
 
+    def test_admin_changelist_loads_books_and_users_with_borrowings(self):
+        admin = sample_user(is_staff=True, is_superuser=True)
+        for _ in range(3):
+            sample_borrowing()
+        self.client.force_login(admin)
+
+        res = self.client.get(
+            reverse("admin:borrowings_borrowing_changelist")
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertContains(res, "BookTitle", count=3)
+
     def test_list_all_borrowings(self):
         user = sample_user()
 
@@ -207,13 +453,13 @@ class AdminBorrowingApiTest(TestCase):
         sample_borrowing(user_id=user)
         sample_borrowing(user_id=self.user)
 
-        borrowings = Borrowing.objects.all()
+        borrowings = Borrowing.objects.order_by("-id")
         serializer = BorrowingSerializer(borrowings, many=True)
 
         res = self.client.get(BORROWING_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_filter_borrowings_by_user(self):
         user = sample_user()
@@ -228,6 +474,855 @@ class AdminBorrowingApiTest(TestCase):
 
         res = self.client.get(BORROWING_URL, {"user_id": user.id})
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data["results"])
+        self.assertIn(serializer2.data, res.data["results"])
+        self.assertNotIn(serializer3.data, res.data["results"])
+
+    def test_list_borrowings_newest_first_across_pages(self):
+        borrowings = [sample_borrowing(user_id=self.user) for _ in range(3)]
+
+        res = self.client.get(BORROWING_URL, {"page_size": 2})
+        self.assertEqual(
+            [borrowing["id"] for borrowing in res.data["results"]],
+            [borrowings[2].id, borrowings[1].id]
+        )
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual(
+            [borrowing["id"] for borrowing in res.data["results"]],
+            [borrowings[0].id]
+        )
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    "DEFAULT_THROTTLE_RATES": dict.fromkeys(
+        settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]
+    ),
+})
+class ConcurrentInventoryTest(TransactionTestCase):
+    CLIENTS = 200
+    INVENTORY = 50
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "stress@test.com",
+            "password",
+        )
+        self.book = sample_book(inventory=self.INVENTORY)
+
+    def run_concurrently(self, request):
+        barrier = threading.Barrier(self.CLIENTS)
+
+        def worker(index):
+            client = QueryBudgetClient(QUERY_BUDGETS)
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                return request(client, index).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.CLIENTS) as executor:
+            return list(executor.map(worker, range(self.CLIENTS)))
+
+    def test_parallel_borrows_never_oversell(self):
+        statuses = self.run_concurrently(
+            lambda client, index: client.post(
+                BORROWING_URL,
+                {
+                    "expected_return_date": in_days(7),
+                    "book_id": self.book.id,
+                },
+                format="json",
+            )
+        )
+
+        self.book.refresh_from_db()
+        self.assertEqual(
+            statuses.count(status.HTTP_201_CREATED), self.INVENTORY
+        )
+        self.assertEqual(
+            statuses.count(status.HTTP_400_BAD_REQUEST),
+            self.CLIENTS - self.INVENTORY
+        )
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(
+            Borrowing.objects.filter(book_id=self.book).count(),
+            self.INVENTORY
+        )
+
+    def test_parallel_returns_restore_exact_inventory(self):
+        borrowings = [
+            Borrowing.objects.create(
+                expected_return_date=in_days(7),
+                book_id=self.book,
+                user_id=self.user,
+            )
+            for _ in range(self.INVENTORY)
+        ]
+        Book.objects.filter(pk=self.book.pk).update(inventory=0)
+        ids = [borrowing.id for borrowing in borrowings]
+
+        statuses = self.run_concurrently(
+            lambda client, index: client.post(
+                return_url(ids[index % len(ids)]), {}, format="json"
+            )
+        )
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, self.INVENTORY)
+        self.assertEqual(statuses.count(status.HTTP_200_OK), self.CLIENTS)
+        self.assertFalse(
+            Borrowing.objects.filter(actual_return_date__isnull=True).exists()
+        )
+
+
+class NotificationOutboxTest(TestCase):
+    def test_deliver_pending_drains_in_batches(self):
+        Notification.objects.bulk_create(
+            Notification(message=f"message {i}") for i in range(250)
+        )
+        notifier = InMemoryNotifier()
+
+        results = [
+            outbox.deliver_pending(notifier, batch_size=100) for _ in range(4)
+        ]
+
+        self.assertEqual(
+            [result["sent"] for result in results], [100, 100, 50, 0]
+        )
+        self.assertEqual(len(notifier.messages), 250)
+        self.assertFalse(
+            Notification.objects.exclude(
+                status=Notification.Status.SENT
+            ).exists()
+        )
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        notification = Notification.objects.enqueue("hello")
+        notifier = InMemoryNotifier(fail_times=1)
+
+        result = outbox.deliver_pending(notifier, backoff=30)
+
+        self.assertEqual(result["retried"], 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.Status.PENDING)
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertIn("unavailable", notification.last_error)
+        self.assertEqual(outbox.deliver_pending(notifier)["sent"], 0)
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.deliver_pending(notifier)["sent"], 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.Status.SENT)
+        self.assertEqual(notification.attempts, 2)
+        self.assertEqual(notifier.messages, ["hello"])
+
+    def test_delivery_gives_up_after_max_attempts(self):
+        notification = Notification.objects.enqueue("hello")
+        notifier = InMemoryNotifier(fail_times=3)
+
+        for _ in range(3):
+            Notification.objects.update(next_attempt_at=timezone.now())
+            outbox.deliver_pending(notifier, max_attempts=3)
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.Status.FAILED)
+        self.assertEqual(notification.attempts, 3)
+        self.assertEqual(notifier.messages, [])
+
+    def test_batch_is_leased_until_every_send_could_time_out(self):
+        Notification.objects.bulk_create(
+            Notification(message=f"message {i}") for i in range(3)
+        )
+        start = timezone.now()
+
+        batch = outbox.claim_batch(
+            batch_size=2, lease=outbox.lease_duration(2, timeout=120)
+        )
+
+        self.assertEqual(len(batch), 2)
+        self.assertFalse(
+            Notification.objects.filter(
+                pk__in=[notification.pk for notification in batch],
+                next_attempt_at__lt=start + timedelta(seconds=240),
+            ).exists()
+        )
+        self.assertEqual(len(outbox.claim_batch(batch_size=2)), 1)
+
+    def test_retry_delay_is_exponential_and_capped(self):
+        self.assertEqual(outbox.retry_delay(1, 30).total_seconds(), 30)
+        self.assertEqual(outbox.retry_delay(3, 30).total_seconds(), 120)
+        self.assertEqual(
+            outbox.retry_delay(20, 30).total_seconds(), outbox.MAX_BACKOFF
+        )
+
+
+class NotifierTest(TestCase):
+    @override_settings(NOTIFIER_BACKEND="memory")
+    def test_backend_is_created_once_from_settings(self):
+        notifier = get_notifier()
+
+        self.assertIsInstance(notifier, InMemoryNotifier)
+        self.assertIs(get_notifier(), notifier)
+
+    @override_settings(NOTIFIER_BACKEND="borrowings.notifiers.NullNotifier")
+    def test_backend_accepts_dotted_path(self):
+        self.assertIsInstance(get_notifier(), NullNotifier)
+
+    @override_settings(
+        NOTIFIER_BACKEND="telegram",
+        TELEGRAM_BOT_TOKEN=None,
+        TELEGRAM_CHAT_ID=None,
+    )
+    def test_missing_telegram_credentials_fail_on_first_use(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_notifier()
+
+    def test_telegram_notifier_reuses_http_session(self):
+        notifier = TelegramNotifier(token="token", chat_id="1")
+
+        self.assertIs(notifier.session, notifier.session)
+
+
+class BorrowingQueryPlanTest(TestCase):
+    """Every list filter combination must be served from an index."""
+
+    FULL_SCAN = re.compile(r"\bSCAN borrowings_borrowing\b(?! USING)")
+
+    def setUp(self):
+        self.user = sample_user()
+        self.admin = sample_user(is_staff=True)
+        for user in (self.user, self.admin):
+            sample_borrowing(user=user)
+            sample_borrowing(user=user, actual_return_date=in_days(2))
+
+    def list_queryset(self, user, params):
+        request = Request(APIRequestFactory().get(BORROWING_URL, params))
+        request.user = user
+        view = BorrowingViewSet(request=request, action="list")
+        return view.get_queryset().order_by(view.paginator.ordering)
+
+    def assertNoFullScan(self, queryset):
+        for page in (queryset[:21], queryset.filter(id__lt=2)[:21]):
+            plan = page.explain()
+            self.assertIsNone(self.FULL_SCAN.search(plan), plan)
+
+    def test_user_list_uses_index(self):
+        for params in ({}, {"is_active": "True"}):
+            with self.subTest(params=params):
+                self.assertNoFullScan(self.list_queryset(self.user, params))
+
+    def test_staff_filters_use_index(self):
+        for params in (
+            {"is_active": "True"},
+            {"user_id": self.user.id},
+            {"user_id": self.user.id, "is_active": "True"},
+        ):
+            with self.subTest(params=params):
+                self.assertNoFullScan(self.list_queryset(self.admin, params))
+
+
+class BatchReturnApiTest(TestCase):
+    def setUp(self):
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(inventory=5)
+
+    def borrow(self, user=None, book=None):
+        return Borrowing.objects.create(
+            expected_return_date=in_days(7),
+            book_id=book or sample_book(),
+            user_id=user or self.user,
+        )
+
+    def return_ids(self, ids):
+        return self.client.post(BATCH_RETURN_URL, {"ids": ids}, format="json")
+
+    def test_batch_return_reports_each_id(self):
+        open_borrowing = self.borrow()
+        returned = self.borrow()
+        Borrowing.objects.filter(pk=returned.pk).update(
+            actual_return_date=datetime.now().date()
+        )
+        foreign = self.borrow(user=sample_user())
+
+        res = self.return_ids(
+            [open_borrowing.id, returned.id, foreign.id, 999999]
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data["results"],
+            [
+                {"id": open_borrowing.id, "status": "returned"},
+                {"id": returned.id, "status": "already_returned"},
+                {"id": foreign.id, "status": "not_found"},
+                {"id": 999999, "status": "not_found"},
+            ]
+        )
+        foreign.refresh_from_db()
+        self.assertIsNone(foreign.actual_return_date)
+
+    def test_batch_return_restores_inventory_per_book(self):
+        other_book = sample_book()
+        ids = [self.borrow(book=self.book).id for _ in range(3)]
+        ids.append(self.borrow(book=other_book).id)
+        Book.objects.filter(pk__in=[self.book.pk, other_book.pk]).update(
+            inventory=0
+        )
+
+        self.return_ids(ids)
+        self.return_ids(ids)
+
+        self.book.refresh_from_db()
+        other_book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 3)
+        self.assertEqual(other_book.inventory, 1)
+        self.assertFalse(
+            Borrowing.objects.filter(actual_return_date__isnull=True).exists()
+        )
+
+    def test_batch_return_query_count_is_constant(self):
+        counts = []
+        for size in (1, 25):
+            ids = [self.borrow().id for _ in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                self.return_ids(ids)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_staff_can_return_any_borrowing(self):
+        borrowing = self.borrow(user=sample_user())
+        self.client.force_authenticate(sample_user(is_staff=True))
+
+        res = self.return_ids([borrowing.id])
+
+        self.assertEqual(res.data["results"][0]["status"], "returned")
+
+    def test_batch_return_requires_ids(self):
+        res = self.return_ids([])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BorrowingExportTest(TestCase):
+    def setUp(self):
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        self.admin = sample_user(is_staff=True)
+        self.client.force_authenticate(self.admin)
+        self.user = sample_user()
+        self.borrowings = [sample_borrowing(user=self.user) for _ in range(3)]
+        self.other = sample_borrowing()
+
+    def export(self, **params):
+        res = self.client.get(EXPORT_URL, params)
+        body = b"".join(res.streaming_content).decode()
+        return res, body
+
+    def test_export_streams_csv(self):
+        res, body = self.export()
+
+        self.assertIsInstance(res, StreamingHttpResponse)
+        self.assertEqual(res["Content-Type"], "text/csv")
+        lines = body.splitlines()
+        self.assertEqual(
+            lines[0],
+            "id,borrow_date,expected_return_date,actual_return_date,"
+            "book_id,book_title,user_id,user_email"
+        )
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[1].startswith(f"{self.borrowings[0].id},"))
+
+    def test_export_ndjson_filtered_by_user(self):
+        res, body = self.export(file_format="ndjson", user_id=self.user.id)
+
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(
+            [row["id"] for row in rows],
+            [borrowing.id for borrowing in self.borrowings]
+        )
+        self.assertEqual(rows[0]["user_email"], self.user.email)
+        self.assertIsNone(rows[0]["actual_return_date"])
+
+    def test_export_filtered_by_borrow_date(self):
+        _, body = self.export(
+            file_format="ndjson", borrowed_from=in_days(1)
+        )
+        self.assertEqual(body, "")
+
+    def test_export_rejects_unknown_format(self):
+        res = self.client.get(EXPORT_URL, {"file_format": "xml"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_staff_only(self):
+        self.client.force_authenticate(self.user)
+        res = self.client.get(EXPORT_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        client = AsyncQueryBudgetClient(QUERY_BUDGETS)
+        token = await sync_to_async(AccessToken.for_user)(self.admin)
+
+        res = await client.get(
+            EXPORT_URL,
+            {"file_format": "ndjson"},
+            headers={"Authorize": f"Bearer {token}"}
+        )
+        body = b"".join(
+            [chunk async for chunk in res.streaming_content]
+        ).decode()
+
+        self.assertTrue(res.is_async)
+        self.assertEqual(len(body.splitlines()), 4)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command(
+            "export_borrowings", "--format", "ndjson",
+            "--user", str(self.user.id), stdout=out
+        )
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class OverdueScanTest(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.user = sample_user()
+        self.due_soon = sample_borrowing(
+            user=self.user, expected_return_date=in_days(2)
+        )
+        self.due_later = sample_borrowing(
+            user=self.user, expected_return_date=in_days(5)
+        )
+        sample_borrowing(
+            expected_return_date=in_days(2),
+            actual_return_date=in_days(1)
+        )
+
+    def days(self, days):
+        return self.today + timedelta(days=days)
+
+    def test_scan_reports_each_borrowing_once(self):
+        self.assertEqual(overdue.scan_overdue(today=self.days(3)), 1)
+        self.assertEqual(overdue.scan_overdue(today=self.days(3)), 0)
+        self.assertEqual(overdue.scan_overdue(today=self.days(7)), 1)
+
+        messages = list(
+            Notification.objects.order_by("id").values_list(
+                "message", flat=True
+            )
+        )
+        self.assertEqual(len(messages), 2)
+        self.assertIn(f"#{self.due_soon.id} ", messages[0])
+        self.assertIn(f"#{self.due_later.id} ", messages[1])
+        self.assertNotIn(f"#{self.due_soon.id} ", messages[1])
+        self.assertEqual(
+            OverdueScan.objects.get().scanned_until, self.days(7)
+        )
+
+    def test_scan_sends_single_digest(self):
+        overdue.scan_overdue(today=self.days(7), digest_size=1)
+
+        notification = Notification.objects.get()
+        self.assertIn("2 newly overdue", notification.message)
+        self.assertIn("...and 1 more", notification.message)
+
+    def test_nothing_overdue_sends_nothing(self):
+        self.assertEqual(overdue.scan_overdue(today=self.days(1)), 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_scan_uses_index(self):
+        for scanned_until in (None, self.days(1)):
+            queryset = overdue.newly_overdue(scanned_until, self.days(3))
+            plan = queryset.explain()
+            self.assertIn("borrowing_overdue_idx", plan)
+            self.assertIsNone(
+                BorrowingQueryPlanTest.FULL_SCAN.search(plan), plan
+            )
+
+    def test_scan_overdue_command(self):
+        out = StringIO()
+        call_command("scan_overdue", stdout=out)
+        self.assertIn("Found 0 newly overdue", out.getvalue())
+
+
+@override_settings(FINE_MULTIPLIER=Decimal("1.5"))
+class BorrowingFeeTest(TestCase):
+    def setUp(self):
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(daily_fee=Decimal("2.00"))
+        self.today = timezone.localdate()
+
+    def borrow(self, user=None, **params):
+        params.setdefault("expected_return_date", in_days(5))
+        return Borrowing.objects.create(
+            book_id=self.book, user_id=user or self.user, **params
+        )
+
+    def fees_for(self, borrowing, today):
+        return fees.annotate_fees(
+            Borrowing.objects.filter(pk=borrowing.pk), today
+        ).values("rental_fee", "fine", "total_fee").get()
+
+    def test_rental_fee_counts_days_until_return(self):
+        borrowing = self.borrow(actual_return_date=in_days(3))
+
+        self.assertEqual(
+            self.fees_for(borrowing, self.today + timedelta(days=27)),
+            {
+                "rental_fee": Decimal("6.00"),
+                "fine": Decimal("0.00"),
+                "total_fee": Decimal("6.00"),
+            }
+        )
+
+    def test_same_day_return_costs_one_day(self):
+        borrowing = self.borrow(actual_return_date=in_days(0))
+        self.assertEqual(
+            self.fees_for(borrowing, self.today)["rental_fee"],
+            Decimal("2.00")
+        )
+
+    def test_overdue_days_are_fined(self):
+        borrowing = self.borrow()
+
+        self.assertEqual(
+            self.fees_for(borrowing, self.today + timedelta(days=9)),
+            {
+                "rental_fee": Decimal("10.00"),
+                "fine": Decimal("12.00"),
+                "total_fee": Decimal("22.00"),
+            }
+        )
+
+    def test_detail_shows_fees(self):
+        borrowing = self.borrow()
+
+        res = self.client.get(detail_url(borrowing.id))
+
+        self.assertEqual(res.data["rental_fee"], "2.00")
+        self.assertEqual(res.data["fine"], "0.00")
+
+    def test_fee_totals_grouped_by_user_and_month(self):
+        other = sample_user()
+        for user in (self.user, self.user, other):
+            self.borrow(user=user, actual_return_date=in_days(3))
+        self.client.force_authenticate(sample_user(is_staff=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(FEES_URL, {"group_by": ["user", "month"]})
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            res.data["results"],
+            [
+                {
+                    "user_id": self.user.id,
+                    "month": self.today.replace(day=1),
+                    "borrowings": 2,
+                    "rental_fee": Decimal("12.00"),
+                    "fine": Decimal("0.00"),
+                    "total_fee": Decimal("12.00"),
+                },
+                {
+                    "user_id": other.id,
+                    "month": self.today.replace(day=1),
+                    "borrowings": 1,
+                    "rental_fee": Decimal("6.00"),
+                    "fine": Decimal("0.00"),
+                    "total_fee": Decimal("6.00"),
+                },
+            ]
+        )
+
+    def test_fee_totals_only_cover_own_borrowings(self):
+        self.borrow(actual_return_date=in_days(3))
+        self.borrow(user=sample_user(), actual_return_date=in_days(3))
+
+        res = self.client.get(FEES_URL)
+
+        self.assertEqual(res.data["results"][0]["borrowings"], 1)
+        self.assertEqual(res.data["results"][0]["total_fee"], Decimal("6.00"))
+
+
+class BorrowingStatisticsTest(TestCase):
+    def setUp(self):
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(inventory=4)
+
+    def borrow(self, book=None):
+        res = self.client.post(
+            BORROWING_URL,
+            {
+                "expected_return_date": in_days(7),
+                "book_id": (book or self.book).id,
+            },
+            format="json"
+        )
+        return res.data["id"]
+
+    def counters(self, model, pk):
+        return model.objects.values_list(*stats.COUNTERS).get(pk=pk)
+
+    def test_borrow_and_return_update_counters(self):
+        first = self.borrow()
+        second = self.borrow()
+        self.borrow(book=sample_book())
+
+        self.assertEqual(self.counters(BookStatistics, self.book.pk), (2, 2))
+        self.assertEqual(self.counters(UserStatistics, self.user.pk), (3, 3))
+
+        self.client.post(return_url(first))
+        self.client.post(BATCH_RETURN_URL, {"ids": [second]}, format="json")
+
+        self.assertEqual(self.counters(BookStatistics, self.book.pk), (2, 0))
+        self.assertEqual(self.counters(UserStatistics, self.user.pk), (3, 1))
+
+    def test_uncounted_return_does_not_go_negative(self):
+        borrowing = sample_borrowing(user=self.user)
+
+        res = self.client.post(return_url(borrowing.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(UserStatistics.objects.exists())
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        self.borrow()
+        sample_borrowing(user=self.user)
+
+        self.assertEqual(
+            stats.reconcile(dry_run=True), {"books": 1, "users": 1}
+        )
+        self.assertEqual(self.counters(UserStatistics, self.user.pk), (1, 1))
+
+        out = StringIO()
+        call_command("reconcile_statistics", stdout=out)
+
+        self.assertIn("1 book(s), 1 user(s)", out.getvalue())
+        self.assertEqual(self.counters(UserStatistics, self.user.pk), (2, 2))
+        self.assertEqual(stats.reconcile(), {"books": 0, "users": 0})
+
+    def test_book_statistics_most_borrowed_first(self):
+        popular = sample_book(inventory=3)
+        for _ in range(2):
+            self.borrow(book=popular)
+        self.borrow()
+        self.client.force_authenticate(sample_user(is_staff=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(BOOK_STATISTICS_URL)
+
+        self.assertEqual(len(queries), 1)
+        results = res.data["results"]
+        self.assertEqual(
+            [row["book_id"] for row in results], [popular.id, self.book.id]
+        )
+        self.assertEqual(results[0]["active_borrowings"], 2)
+        self.assertEqual(results[0]["inventory"], 1)
+        self.assertAlmostEqual(results[0]["utilization"], 2 / 3)
+
+    def test_statistics_pages_through_ties(self):
+        ties = 1100
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Title {i}",
+                author="Author",
+                cover=1,
+                inventory=1,
+                daily_fee=1,
+            )
+            for i in range(ties)
+        )
+        BookStatistics.objects.bulk_create(
+            BookStatistics(book_id=book, total_borrowings=1)
+            for book in books
+        )
+        popular = BookStatistics.objects.create(
+            book_id=sample_book(), total_borrowings=2
+        )
+        self.client.force_authenticate(sample_user(is_staff=True))
+
+        ids, url, pages = [], f"{BOOK_STATISTICS_URL}?page_size=100", 0
+        while url:
+            res = self.client.get(url)
+            ids += [row["book_id"] for row in res.data["results"]]
+            url, pages = res.data["next"], pages + 1
+            if pages == 2:
+                # A changed counter moves only its own row
+                BookStatistics.objects.filter(pk=popular.pk).update(
+                    total_borrowings=0
+                )
+
+        self.assertEqual(pages, 12)
+        self.assertEqual(ids[:3], [popular.pk, books[-1].pk, books[-2].pk])
+        self.assertEqual(ids[1:-1], [book.pk for book in reversed(books)])
+        self.assertEqual(ids[-1], popular.pk)
+
+        res = self.client.get(res.data["previous"])
+        self.assertEqual(
+            [row["book_id"] for row in res.data["results"]], ids[-102:-2]
+        )
+
+    def test_user_statistics_staff_only(self):
+        self.borrow()
+
+        res = self.client.get(USER_STATISTICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(sample_user(is_staff=True))
+        res = self.client.get(USER_STATISTICS_URL)
+        self.assertEqual(res.data["results"][0]["email"], self.user.email)
+
+
+class StatisticsReconcileLockTest(TransactionTestCase):
+    def test_reconcile_locks_before_counting(self):
+        # A borrow committing between the counts and the rewrite would
+        # fail a deferred transaction with "database is locked"
+        sample_borrowing()
+
+        with CaptureQueriesContext(connection) as queries:
+            stats.reconcile()
+
+        self.assertEqual(statements(queries)[0], "BEGIN IMMEDIATE")
+
+
+class BorrowingThrottleTest(TestCase):
+    @override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {
+            **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"],
+            "borrowing_create": "2/min",
+        },
+    })
+    def test_create_borrowing_is_throttled_per_user(self):
+        book = sample_book(inventory=10)
+        payload = {"expected_return_date": in_days(7), "book_id": book.id}
+        client = QueryBudgetClient(QUERY_BUDGETS)
+        client.force_authenticate(sample_user())
+
+        statuses = [
+            client.post(BORROWING_URL, payload, format="json").status_code
+            for _ in range(3)
+        ]
+        res = client.post(BORROWING_URL, payload, format="json")
+
+        self.assertEqual(statuses[:2], [status.HTTP_201_CREATED] * 2)
+        self.assertEqual(statuses[2], status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(res["Retry-After"]), 0)
+        self.assertEqual(
+            client.get(BORROWING_URL).status_code, status.HTTP_200_OK
+        )
+
+        client.force_authenticate(sample_user())
+        res = client.post(BORROWING_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+
+class AsyncBorrowingApiTest(TestCase):
+    """GET under ASGI, served by borrowings.async_views."""
+
+    def setUp(self):
+        self.user = sample_user()
+        self.headers = {
+            "Authorize": f"Bearer {AccessToken.for_user(self.user)}"
+        }
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        self.async_client = AsyncQueryBudgetClient(QUERY_BUDGETS)
+        self.client.credentials(HTTP_AUTHORIZE=self.headers["Authorize"])
+        self.borrowings = [
+            sample_borrowing(user=self.user),
+            sample_borrowing(user=self.user),
+            sample_borrowing(
+                user=self.user, actual_return_date=in_days(0)
+            ),
+        ]
+        self.other = sample_borrowing()
+
+    async def get(self, url, data=None, **headers):
+        return await self.async_client.get(
+            url, data, headers={**self.headers, **headers}
+        )
+
+    async def test_list_matches_drf_view(self):
+        for params in ({}, {"is_active": "true"}, {"page_size": 1}):
+            with self.subTest(params=params):
+                res = await self.get(BORROWING_URL, params)
+                expected = await sync_to_async(self.client.get)(
+                    BORROWING_URL, params
+                )
+
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertNotIn("Allow", res)
+                self.assertEqual(res.json(), expected.json())
+                self.assertEqual(res["ETag"], expected["ETag"])
+                self.assertIn("Authorize", res["Vary"])
+
+    async def test_list_pages(self):
+        res = await self.get(BORROWING_URL, {"page_size": 2})
+        ids = [row["id"] for row in res.json()["results"]]
+        res = await self.get(res.json()["next"])
+        ids += [row["id"] for row in res.json()["results"]]
+        res = await self.get(res.json()["previous"])
+
+        self.assertEqual(
+            ids, [borrowing.id for borrowing in reversed(self.borrowings)]
+        )
+        self.assertEqual(
+            [row["id"] for row in res.json()["results"]], ids[:2]
+        )
+
+    async def test_detail_matches_drf_view(self):
+        url = detail_url(self.borrowings[0].id)
+        res = await self.get(url)
+        expected = await sync_to_async(self.client.get)(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), expected.json())
+        self.assertEqual(res["ETag"], expected["ETag"])
+
+        res = await self.get(url, **{"If-None-Match": res["ETag"]})
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_other_users_borrowing_is_not_found(self):
+        res = await self.get(detail_url(self.other.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            res.json(), {"detail": "No Borrowing matches the given query."}
+        )
+
+    async def test_authentication_required(self):
+        res = await self.async_client.get(BORROWING_URL)
+        invalid = await self.async_client.get(
+            BORROWING_URL, headers={"Authorize": "Bearer invalid"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn("Bearer", res["WWW-Authenticate"])
+        self.assertEqual(invalid.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(invalid.json()["code"], "token_not_valid")
+
+    @override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {
+            **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"],
+            "user": "1/min",
+        },
+    })
+    async def test_throttled(self):
+        first = await self.get(BORROWING_URL)
+        second = await self.get(BORROWING_URL)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            second.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertGreater(int(second["Retry-After"]), 0)
@@ -1,7 +1,13 @@
 from rest_framework import routers
-from borrowings.views import BorrowingViewSet
+from borrowings.views import (
+    BookStatisticsViewSet,
+    BorrowingViewSet,
+    UserStatisticsViewSet,
+)
 
 router = routers.DefaultRouter()
+router.register("statistics/books", BookStatisticsViewSet)
+router.register("statistics/users", UserStatisticsViewSet)
 router.register("", BorrowingViewSet)
 urlpatterns = router.urls
 
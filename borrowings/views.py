@@ -1,54 +1,121 @@
 from datetime import datetime
 
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
-from borrowings.models import Borrowing
+from borrowings import exporters, fees
+from borrowings.cache import get_borrowings_version
+from borrowings.models import (
+    BookStatistics,
+    Borrowing,
+    Notification,
+    UserStatistics,
+)
 from borrowings.serializers import (
+    BookStatisticsSerializer,
+    BorrowingBatchReturnSerializer,
     BorrowingSerializer,
     BorrowingCreateSerializer,
     BorrowingDetailSerializer,
+    BorrowingExportSerializer,
+    BorrowingFeeTotalsSerializer,
+    UserStatisticsSerializer,
+)
+from library_service.conditional import ConditionalGetMixin
+from library_service.pagination import (
+    MostActiveCursorPagination,
+    MostBorrowedCursorPagination,
+    NewestFirstCursorPagination,
 )
+from library_service.transaction import immediate_atomic
+
+
+def list_etag_parts(request, version):
+    """The borrowings version changes with every write of a borrowing, so
+    list ETags cost a cache read instead of a scan of the listed rows."""
+    return version, request.user.pk, request.build_absolute_uri()
+
+
+def detail_etag_parts(borrowing):
+    return (
+        borrowing.pk,
+        borrowing.borrow_date,
+        borrowing.expected_return_date,
+        borrowing.actual_return_date,
+        borrowing.total_fee,
+        borrowing.fine,
+        str(borrowing.book_id),
+        str(borrowing.user_id),
+    )
 
-from borrowings.telegram_api import telegram_sender
+
+def filter_visible(request, queryset):
+    """Borrowings of request.user, or of anyone for staff, narrowed by the
+    is_active and user_id query parameters."""
+    current_user = request.user
+    is_active = request.query_params.get("is_active")
+
+    if is_active:
+        queryset = queryset.filter(actual_return_date__isnull=True)
+    if not current_user.is_staff:
+        queryset = queryset.filter(user_id=current_user)
+    else:
+        user_id = request.query_params.get("user_id")
+        if user_id:
+            queryset = queryset.filter(user_id=user_id)
+    return queryset
 
 
 class BorrowingViewSet(
+    ConditionalGetMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet
 ):
-    queryset = Borrowing.objects.select_related("book_id")
+    queryset = Borrowing.objects.select_related("book_id", "user_id")
     permission_classes = (IsAuthenticated,)
+    pagination_class = NewestFirstCursorPagination
+    etag_vary = ("Authorize",)
+
+    @property
+    def throttle_scope(self):
+        return "borrowing_create" if self.action == "create" else None
 
     def get_serializer_class(self):
         if self.action in ["retrieve", "return_borrowing"]:
             return BorrowingDetailSerializer
         if self.action == "create":
             return BorrowingCreateSerializer
+        if self.action == "return_borrowings":
+            return BorrowingBatchReturnSerializer
         return BorrowingSerializer
 
     def get_queryset(self):
-        return self.filter_queryset(self.queryset)
+        queryset = self.filter_queryset(self.queryset)
+        if self.action in ["retrieve", "return_borrowing"]:
+            queryset = fees.annotate_fees(queryset)
+        return queryset
+
+    def get_object(self):
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
+
+    def get_list_etag(self, request):
+        return list_etag_parts(request, get_borrowings_version())
+
+    def get_detail_etag(self, request):
+        return detail_etag_parts(self.get_object())
 
     def filter_queryset(self, queryset):
-        current_user = self.request.user
-        is_active = self.request.query_params.get("is_active")
-
-        if is_active:
-            queryset = queryset.filter(actual_return_date__isnull=True)
-        if not current_user.is_staff:
-            queryset = queryset.filter(user_id=current_user)
-        else:
-            user_id = self.request.query_params.get("user_id")
-            if user_id:
-                queryset = queryset.filter(user_id=user_id)
-        return queryset
+        return filter_visible(self.request, queryset)
 
     @staticmethod
     def notify_borrowing(borrowing):
@@ -60,11 +127,12 @@ class BorrowingViewSet(
             f"Book Title: {borrowing.book_id.title}\n"
             f"Book Author: {borrowing.book_id.author}\n"
         )
-        telegram_sender.send_message(message)
+        Notification.objects.enqueue(message)
 
     def perform_create(self, serializer):
-        borrowing = serializer.save(user=self.request.user)
-        self.notify_borrowing(borrowing)
+        with immediate_atomic():
+            borrowing = serializer.save(user=self.request.user)
+            self.notify_borrowing(borrowing)
 
     @action(
         methods=["POST"],
@@ -74,8 +142,14 @@ class BorrowingViewSet(
     )
     def return_borrowing(self, request, pk=None):
         """
-            Endpoint for making a borrowing as returned
-            by providing the actual return date
+            Endpoint for making a borrowing as returned.
+            Returning an already returned borrowing is a no-op.
+
+            Query budget: one SELECT of the borrowing with its book, user
+            and fees, and one conditional UPDATE of actual_return_date.
+            Only when that UPDATE returns the loan, one UPDATE restores
+            the book inventory and one per statistics table adjusts the
+            counters. The response is built from the loaded row.
             :param request:
             :param pk:
             :return:
@@ -89,13 +163,96 @@ class BorrowingViewSet(
             partial=True
         )
         serializer.is_valid(raise_exception=True)
+        serializer.save(actual_return_date=datetime.now().date())
 
-        borrowing.actual_return_date = datetime.now().date()
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-        borrowing.save()
-        borrowing.refresh_from_db()
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="return",
+        permission_classes=[IsAuthenticated, ]
+    )
+    def return_borrowings(self, request):
+        """
+            Endpoint for returning many borrowings at once, e.g. from a
+            drop box. Staff can return any borrowing, other users only
+            their own. Responds with the outcome for every id.
+            """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        results = Borrowing.objects.return_borrowings(
+            serializer.validated_data["ids"],
+            return_date=datetime.now().date(),
+            user=None if request.user.is_staff else request.user,
+        )
+        return Response(
+            {
+                "results": [
+                    {"id": pk, "status": result}
+                    for pk, result in results.items()
+                ]
+            },
+            status=status.HTTP_200_OK
+        )
+
+    @extend_schema(parameters=[BorrowingFeeTotalsSerializer])
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="fees",
+        permission_classes=[IsAuthenticated, ]
+    )
+    def fee_totals(self, request):
+        """
+            Endpoint for rental fee and fine totals, optionally grouped
+            by user and/or borrow month, computed in a single query
+            """
+        params = BorrowingFeeTotalsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        group_by = params.validated_data.pop("group_by", ())
+        group_by = [name for name in fees.GROUPINGS if name in group_by]
+
+        queryset = exporters.filter_borrowings(
+            self.get_queryset(), **params.validated_data
+        )
+        return Response(
+            {"results": fees.fee_totals(queryset, group_by)},
+            status=status.HTTP_200_OK
+        )
+
+    @extend_schema(parameters=[BorrowingExportSerializer])
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="export",
+        permission_classes=[IsAdminUser, ]
+    )
+    def export(self, request):
+        """
+            Endpoint for streaming the full borrowing history as CSV or
+            NDJSON, optionally filtered by borrow date range and user
+            """
+        params = BorrowingExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = dict(params.validated_data)
+        file_format = filters.pop("file_format")
+
+        queryset = exporters.filter_borrowings(
+            Borrowing.objects.all(), **filters
+        )
+        export = exporters.export_borrowings
+        if isinstance(request._request, ASGIRequest):
+            export = exporters.aexport_borrowings
+        response = StreamingHttpResponse(
+            export(queryset, file_format),
+            content_type=exporters.CONTENT_TYPES[file_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="borrowings.{file_format}"'
+        )
+        return response
 
     @extend_schema(
         parameters=[
@@ -114,3 +271,19 @@ class BorrowingViewSet(
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
+
+
+class BookStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
+    """Most borrowed books first, with their current utilization."""
+    queryset = BookStatistics.objects.select_related("book_id")
+    serializer_class = BookStatisticsSerializer
+    permission_classes = (IsAdminUser,)
+    pagination_class = MostBorrowedCursorPagination
+
+
+class UserStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
+    """Users with the most active loans first."""
+    queryset = UserStatistics.objects.select_related("user_id")
+    serializer_class = UserStatisticsSerializer
+    permission_classes = (IsAdminUser,)
+    pagination_class = MostActiveCursorPagination
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class LibraryServiceConfig(AppConfig):
+    name = "library_service"
+    verbose_name = "Library service"
+
+    def ready(self):
+        from library_service import instrumentation
+
+        connection_created.connect(instrumentation.install)
@@ -0,0 +1,19 @@
+"""
+URL configuration for GET and HEAD requests served under ASGI.
+
+The hot read endpoints are answered by native async views, every other
+URL falls through to `library_service.urls`.
+"""
+from django.urls import path
+
+from books.async_views import BookDetailView, BookListView
+from borrowings.async_views import BorrowingDetailView, BorrowingListView
+from library_service.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("api/books/", BookListView.as_view()),
+    path("api/books/<int:pk>/", BookDetailView.as_view()),
+    path("api/borrowings/", BorrowingListView.as_view()),
+    path("api/borrowings/<int:pk>/", BorrowingDetailView.as_view()),
+    *sync_urlpatterns,
+]
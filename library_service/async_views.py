@@ -0,0 +1,174 @@
+"""Native async views for the hot read endpoints.
+
+They are routed only under ASGI (see library_service.middleware) and
+answer like the DRF viewsets they stand in for: the same authentication,
+permissions, throttling, conditional GET, pagination and error bodies.
+Only JSON is rendered here. Requests negotiating another format, such as
+the browsable API, are handed to the DRF view of the same URL.
+
+Django 4.2 still runs every query in a thread, but that thread is held
+for the query alone, never while a slow client sends its request or
+reads the response.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.urls import resolve
+from django.utils.cache import parse_etags, patch_vary_headers
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from library_service.conditional import make_etag
+from user.authentication import CachedJWTAuthentication
+
+
+class AsyncReadView(View):
+    """Base class; subclasses implement `async def get()`."""
+
+    permission_classes = ()
+    throttle_scope = None
+    etag_vary = ()
+    authenticator = CachedJWTAuthentication()
+    renderer = JSONRenderer()
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.request = request = Request(request)
+        if self.use_sync_view(request):
+            return await self.sync_view(request._request)
+        try:
+            await self.initial(request)
+            response = await self.get(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        patch_vary_headers(response, ("Accept", *self.etag_vary))
+        return response
+
+    def use_sync_view(self, request):
+        """Whether the DRF view should answer instead, e.g. for HTML."""
+        renderers = [
+            renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+        ]
+        negotiator = api_settings.DEFAULT_CONTENT_NEGOTIATION_CLASS()
+        try:
+            renderer, _ = negotiator.select_renderer(request, renderers)
+        except exceptions.NotAcceptable:
+            return True
+        return renderer.format != self.renderer.format
+
+    @sync_to_async
+    def sync_view(self, request):
+        match = resolve(request.path_info, urlconf=settings.ROOT_URLCONF)
+        request.resolver_match = match
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    async def initial(self, request):
+        result = await self.authenticator.aauthenticate(request)
+        if result is None:
+            request.user = api_settings.UNAUTHENTICATED_USER()
+            request.auth = None
+        else:
+            request.user, request.auth = result
+        self.check_permissions(request)
+        if settings.THROTTLE_BACKEND == "local":
+            self.check_throttles(request)
+        else:
+            await sync_to_async(self.check_throttles)(request)
+
+    def permission_denied(self, request, message=None, code=None):
+        if request.auth is None:
+            raise exceptions.NotAuthenticated()
+        raise exceptions.PermissionDenied(detail=message, code=code)
+
+    def check_permissions(self, request):
+        for permission in self.permission_classes:
+            permission = permission()
+            if not permission.has_permission(request, self):
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, "message", None),
+                    code=getattr(permission, "code", None)
+                )
+
+    def check_object_permissions(self, request, obj):
+        for permission in self.permission_classes:
+            permission = permission()
+            if not permission.has_object_permission(request, self, obj):
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, "message", None),
+                    code=getattr(permission, "code", None)
+                )
+
+    def check_throttles(self, request):
+        throttle_durations = []
+        for throttle in api_settings.DEFAULT_THROTTLE_CLASSES:
+            throttle = throttle()
+            if not throttle.allow_request(request, self):
+                throttle_durations.append(throttle.wait())
+
+        if throttle_durations:
+            durations = [
+                duration for duration in throttle_durations
+                if duration is not None
+            ]
+            raise exceptions.Throttled(max(durations, default=None))
+
+    async def get_object(self, queryset, **lookup):
+        try:
+            obj = await queryset.aget(**lookup)
+        except queryset.model.DoesNotExist:
+            raise Http404(
+                f"No {queryset.model._meta.object_name} "
+                f"matches the given query."
+            )
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def check_etag(self, request, etag_parts):
+        """The ETag of the response and whether the client has it."""
+        etag = make_etag(self.renderer.format, *etag_parts)
+        if_none_match = request.headers.get("If-None-Match")
+        return etag, bool(
+            if_none_match and etag in parse_etags(if_none_match)
+        )
+
+    def respond(self, data, status_code=status.HTTP_200_OK, etag=None):
+        if status_code == status.HTTP_304_NOT_MODIFIED:
+            response = HttpResponse(status=status_code)
+        else:
+            response = HttpResponse(
+                self.renderer.render(data),
+                status=status_code,
+                content_type=self.renderer.media_type,
+            )
+        if etag is not None:
+            response["ETag"] = etag
+        return response
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (
+                exceptions.NotAuthenticated,
+                exceptions.AuthenticationFailed
+        )):
+            exc.auth_header = self.authenticator.authenticate_header(
+                self.request
+            )
+
+        response = exception_handler(
+            exc, {"view": self, "request": self.request}
+        )
+        if response is None:
+            raise exc
+
+        rendered = self.respond(response.data, response.status_code)
+        for header in ("WWW-Authenticate", "Retry-After"):
+            if response.has_header(header):
+                rendered[header] = response[header]
+        return rendered
@@ -0,0 +1,60 @@
+import hashlib
+
+from django.utils.cache import parse_etags, patch_vary_headers, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    return quote_etag(
+        hashlib.md5(
+            repr(parts).encode(), usedforsecurity=False
+        ).hexdigest()
+    )
+
+
+class ConditionalGetMixin:
+    """Answer a matching If-None-Match with 304 before serializing.
+
+    Views provide `get_list_etag` / `get_detail_etag`, which should cost
+    at most one cheap query. The rendered format is part of every ETag,
+    since JSON and the browsable API share a URL. Per-user resources list
+    the auth header in `etag_vary`.
+    """
+
+    etag_vary = ()
+
+    def get_list_etag(self, request):
+        return None
+
+    def get_detail_etag(self, request):
+        return None
+
+    def conditional_response(self, etag_parts, handler, *args, **kwargs):
+        if etag_parts is None:
+            return handler(self.request, *args, **kwargs)
+
+        etag = make_etag(self.request.accepted_renderer.format, *etag_parts)
+        if_none_match = self.request.headers.get("If-None-Match")
+        if if_none_match and etag in parse_etags(if_none_match):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(self.request, *args, **kwargs)
+
+        if response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED
+        ):
+            response["ETag"] = etag
+            patch_vary_headers(response, self.etag_vary)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_list_etag(request), super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_detail_etag(request), super().retrieve, *args, **kwargs
+        )
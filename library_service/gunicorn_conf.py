@@ -0,0 +1,100 @@
+"""
+Gunicorn settings for production.
+
+    python manage.py migrate
+    gunicorn --config python:library_service.gunicorn_conf
+
+SERVER_INTERFACE selects the application: "wsgi" (default) serves
+library_service.wsgi from threaded workers, "asgi" serves
+library_service.asgi from uvicorn workers. Worker counts follow the CPUs
+available to the process unless WEB_CONCURRENCY is set.
+
+With more than one worker the cache must be shared between them, so
+CACHE_BACKEND defaults to "file" and an explicit CACHE_BACKEND=locmem is
+refused. Throttle buckets stay in each worker unless CACHE_BACKEND is
+redis or memcached, which makes THROTTLE_BACKEND default to "cache".
+
+Migrations are not run here; run them once per release before starting
+or reloading the server. `kill -HUP <master pid>` reloads gracefully:
+new workers start with the new code, while old ones finish their
+requests within graceful_timeout.
+
+For more information on this file, see
+https://docs.gunicorn.org/en/stable/settings.html
+"""
+import glob
+import os
+
+interface = os.getenv("SERVER_INTERFACE", "wsgi")
+cpus = (
+    len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity")
+    else os.cpu_count()
+) or 1
+
+bind = os.getenv("SERVER_BIND", "0.0.0.0:8000")
+
+if interface == "asgi":
+    wsgi_app = "library_service.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+    # One event loop per CPU serves any number of connections
+    workers = int(os.getenv("WEB_CONCURRENCY", cpus))
+else:
+    wsgi_app = "library_service.wsgi:application"
+    worker_class = "gthread"
+    workers = int(os.getenv("WEB_CONCURRENCY", 2 * cpus + 1))
+    # Every request, including a slow client's upload, holds a thread
+    threads = int(os.getenv("SERVER_THREADS", 4))
+
+if workers > 1:
+    # A locmem cache per worker would give each its own catalog version,
+    # ETags and cached users: a borrow served by one worker would leave
+    # the others answering with stale inventory. Workers are forked
+    # after this file runs and read the settings from the environment.
+    if os.getenv("CACHE_BACKEND") == "locmem":
+        raise RuntimeError(
+            f"CACHE_BACKEND=locmem is not shared between the {workers} "
+            f"workers; use CACHE_BACKEND=file, redis or memcached, or "
+            f"WEB_CONCURRENCY=1"
+        )
+    os.environ.setdefault("CACHE_BACKEND", "file")
+    # The file backend lists its directory on every write, too slow for
+    # a bucket update per request
+    if os.environ["CACHE_BACKEND"] in ("redis", "memcached"):
+        os.environ.setdefault("THROTTLE_BACKEND", "cache")
+
+# Seconds an idle keep-alive connection stays open. Behind a load
+# balancer, set this above the balancer's idle timeout so that it never
+# reuses a connection the server is closing.
+keepalive = int(os.getenv("SERVER_KEEPALIVE", 5))
+timeout = int(os.getenv("SERVER_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+
+# Restart a worker after this many requests (0 never does), spread out
+# so that workers do not restart together
+max_requests = int(os.getenv("SERVER_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+# Loading the application in each worker instead of the master keeps
+# HUP reloads picking up new code.
+preload_app = False
+
+# Heartbeat files in memory; a container's overlay filesystem can stall
+# them long enough for the master to kill healthy workers.
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("SERVER_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """Start the metrics of the workers from zero.
+
+    Only when the master starts: a HUP reload keeps the files of old
+    workers, so counters carry on across releases.
+    """
+    directory = os.getenv("METRICS_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            os.remove(path)
@@ -0,0 +1,79 @@
+"""SQL statistics of a unit of work, such as a request.
+
+Every database connection runs its queries through record_query (see
+LibraryServiceConfig.ready), which adds them to the active QueryStats.
+A context variable carries the active stats, so queries that async views
+run in worker threads are counted too. Without active stats a query only
+pays for one context variable lookup.
+"""
+import time
+from contextvars import ContextVar
+
+_current = ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    """Query count, SQL time and slowest statement.
+
+    Stats activated while others are active also count towards those.
+    """
+
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = None
+        self.slowest_duration = 0.0
+        self.statements = [] if keep_statements else None
+        self.parent = None
+
+    def activate(self):
+        self.parent = _current.get()
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+    def __enter__(self):
+        self._token = self.activate()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.deactivate(self._token)
+
+    def record(self, sql, duration):
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.duration += duration
+            if duration >= stats.slowest_duration:
+                stats.slowest, stats.slowest_duration = sql, duration
+            if stats.statements is not None:
+                stats.statements.append(sql)
+            stats = stats.parent
+
+    def server_timing(self):
+        """Server-Timing header value, durations in milliseconds."""
+        return (
+            f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest_duration * 1000:.2f}"
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(sql, time.perf_counter() - start)
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver adding record_query to `connection`."""
+    if record_query not in connection.execute_wrappers:
+        # First, so that the wrappers of CaptureQueriesContext and other
+        # context managers stay last for them to pop
+        connection.execute_wrappers.insert(0, record_query)
@@ -0,0 +1,259 @@
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from books.cache import invalidate_catalog
+from books.models import Book
+from borrowings import stats
+from borrowings.cache import invalidate_borrowings
+from borrowings.models import Borrowing
+
+WORDS = (
+    "river night garden shadow empire winter silver dragon secret ocean "
+    "city stone forest queen machine summer island letter mountain glass "
+    "house storm child war story fire moon road king light bridge crown "
+    "dream iron mirror north paper rain sea song star sun time tower wind"
+).split()
+FIRST_NAMES = (
+    "Anna Boris Clara David Elena Felix Greta Hugo Irene Jonas Karin Leo "
+    "Maria Nikolai Olga Pavel Rosa Stefan Tamara Viktor"
+).split()
+LAST_NAMES = (
+    "Adler Berg Costa Duval Ek Fischer Grant Holm Ivanova Jensen Klein "
+    "Larsen Moreau Novak Orlova Petrov Quinn Rossi Sato Weber"
+).split()
+# Share of active borrowings past their expected return date, and by
+# how many days at most
+OVERDUE_SHARE = 0.1
+MAX_DAYS_OVERDUE = 30
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic books, users and borrowings "
+        "up to the given totals"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--borrowings", type=int, default=1_000_000)
+        parser.add_argument(
+            "--active-ratio",
+            type=float,
+            default=0.1,
+            help="Share of new borrowings not returned yet",
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.0,
+            help="Skew of book popularity; 0 borrows all books equally",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Spread borrow dates of returned borrowings over this "
+                 "many days",
+        )
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="Password of every new user, hashed once",
+        )
+        parser.add_argument("--batch-size", type=int, default=50_000)
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Random seed"
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.today = timezone.localdate()
+        start = time.perf_counter()
+
+        books = self.seed_books(options["books"])
+        users = self.seed_users(options["users"], options["password"])
+        borrowings = self.seed_borrowings(
+            options["borrowings"],
+            options["active_ratio"],
+            options["zipf"],
+            options["days"],
+        )
+        if books:
+            invalidate_catalog()
+        if borrowings:
+            invalidate_borrowings()
+            stats.reconcile()
+
+        self.stdout.write(
+            f"Added {books} book(s), {users} user(s) and {borrowings} "
+            f"borrowing(s) in {time.perf_counter() - start:.1f}s"
+        )
+
+    def insert(self, model, fields, rows):
+        """Insert `rows` with batched executemany, skipping save().
+
+        Returns the number of rows inserted.
+        """
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ", ".join(
+            connection.ops.quote_name(model._meta.get_field(name).column)
+            for name in fields
+        )
+        placeholders = ", ".join(["%s"] * len(fields))
+        sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+        inserted = 0
+        rows = iter(rows)
+        with self.bulk_loading():
+            while batch := list(itertools.islice(rows, self.batch_size)):
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.executemany(sql, batch)
+                inserted += len(batch)
+        return inserted
+
+    @contextmanager
+    def bulk_loading(self):
+        """Speed up SQLite while inserting, restoring its settings after.
+
+        The rows are valid by construction, so CHECK constraints, which
+        call back into Python for every row, are not evaluated. A 256 MiB
+        page cache keeps the random inserts into indexes in memory.
+        """
+        if connection.vendor != "sqlite":
+            yield
+            return
+        pragmas = {"ignore_check_constraints": 1, "cache_size": -256 * 1024}
+        previous = {}
+        with connection.cursor() as cursor:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}")
+                previous[name] = cursor.fetchone()[0]
+                cursor.execute(f"PRAGMA {name} = {value}")
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                for name, value in previous.items():
+                    cursor.execute(f"PRAGMA {name} = {value}")
+
+    def seed_books(self, total):
+        missing = total - Book.objects.count()
+        if missing <= 0:
+            return 0
+        rng = self.rng
+
+        def rows():
+            for _ in range(missing):
+                title = " ".join(
+                    rng.choice(WORDS) for _ in range(rng.randint(1, 4))
+                )
+                yield (
+                    f"{rng.randint(50, 500) / 100:.2f}",
+                    rng.randint(0, 10),
+                    rng.choice(Book.Cover.values),
+                    f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    title.capitalize(),
+                )
+
+        return self.insert(
+            Book,
+            ("daily_fee", "inventory", "cover", "author", "title"),
+            rows(),
+        )
+
+    def seed_users(self, total, password):
+        user_model = get_user_model()
+        existing = user_model.objects.count()
+        missing = total - existing
+        if missing <= 0:
+            return 0
+        # Hashing costs hundreds of milliseconds, so all users share one
+        password = make_password(password)
+        joined = connection.ops.adapt_datetimefield_value(timezone.now())
+        tag = self.rng.getrandbits(32)
+
+        def rows():
+            for i in range(existing, total):
+                email = f"reader{i}.{tag:08x}@seed.library.test"
+                yield (
+                    password, False, email, "", "", email,
+                    False, True, joined,
+                )
+
+        return self.insert(
+            user_model,
+            (
+                "password", "is_superuser", "username", "first_name",
+                "last_name", "email", "is_staff", "is_active", "date_joined",
+            ),
+            rows(),
+        )
+
+    def seed_borrowings(self, total, active_ratio, zipf, days):
+        missing = total - Borrowing.objects.count()
+        if missing <= 0:
+            return 0
+        rng = self.rng
+        book_ids = list(Book.objects.values_list("pk", flat=True))
+        user_ids = list(get_user_model().objects.values_list("pk", flat=True))
+        if not book_ids or not user_ids:
+            raise CommandError("Borrowings need at least one book and user")
+        # Popularity by rank follows Zipf's law; shuffling spreads the
+        # popular titles over the whole id range.
+        rng.shuffle(book_ids)
+        book_weights = list(itertools.accumulate(
+            1 / rank ** zipf for rank in range(1, len(book_ids) + 1)
+        ))
+        # Dates by the number of days before today, negative in the future
+        dates = {
+            offset: connection.ops.adapt_datefield_value(
+                self.today - timedelta(days=offset)
+            )
+            for offset in range(-14, max(days, 14 + MAX_DAYS_OVERDUE) + 1)
+        }
+        uniform = rng.random
+
+        def rows():
+            for book_id in rng.choices(
+                    book_ids, cum_weights=book_weights, k=missing
+            ):
+                loan_days = 1 + int(uniform() * 14)
+                if uniform() < active_ratio:
+                    returned = None
+                    borrowed = int(uniform() * (loan_days + 1))
+                    if uniform() < OVERDUE_SHARE:
+                        borrowed = loan_days + 1 + int(
+                            uniform() * MAX_DAYS_OVERDUE
+                        )
+                else:
+                    borrowed = int(uniform() * (days + 1))
+                    # Some readers bring books back late
+                    returned = dates[
+                        max(0, borrowed - int(uniform() * (loan_days + 4)))
+                    ]
+                yield (
+                    dates[borrowed],
+                    dates[borrowed - loan_days],
+                    returned,
+                    book_id,
+                    user_ids[int(uniform() * len(user_ids))],
+                )
+
+        return self.insert(
+            Borrowing,
+            (
+                "borrow_date", "expected_return_date", "actual_return_date",
+                "book_id", "user_id",
+            ),
+            rows(),
+        )
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into every replica in "
+        "DATABASE_REPLICAS"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Copy again every this many seconds until interrupted",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured in DATABASE_REPLICAS")
+        if connections[DEFAULT_DB_ALIAS].vendor != "sqlite":
+            raise CommandError(
+                "Only SQLite databases can be copied, use the replication "
+                "of your database server instead"
+            )
+
+        while True:
+            self.sync()
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
+
+    def sync(self):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias]
+            replica.ensure_connection()
+            # The backup API copies a consistent snapshot while the
+            # primary keeps taking writes, and readers of the replica
+            # switch to the new pages atomically.
+            primary.connection.backup(replica.connection)
+            self.stdout.write(f"Copied primary to {alias}")
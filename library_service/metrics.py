@@ -0,0 +1,267 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters and fixed-bucket histograms keep their values in the memory of
+the process. Recording takes a lock and a few additions, so it is cheap
+enough for every request.
+
+With METRICS_DIR set, each process also writes its values to a file of
+its own there, at most METRICS_FLUSH_INTERVAL seconds after they changed
+and at exit, and collect() sums the files of all processes. Files of
+exited processes are kept so that counters never go backwards; empty the
+directory when the service starts, as library_service.gunicorn_conf does.
+"""
+import atexit
+import bisect
+import glob
+import json
+import math
+import os
+import threading
+import uuid
+
+from django.conf import settings
+
+# Seconds; the Prometheus client defaults
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+_metrics = {}
+_lock = threading.Lock()
+_flush_timer = None
+_filename = None
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        if name in _metrics:
+            raise ValueError(f"Metric {name} is already registered")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        _metrics[name] = self
+
+    def dump(self):
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "values": [
+                [list(labels), self.copy_value(value)]
+                for labels, value in self.values.items()
+            ],
+        }
+
+    @staticmethod
+    def copy_value(value):
+        return value
+
+    @staticmethod
+    def add_values(a, b):
+        return a + b
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        """Add `amount` to the series of `labels` (in labelnames order)."""
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+        _changed()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+            self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        """Count `value` in its bucket of the series of `labels`.
+
+        Buckets are stored as plain counts and made cumulative only when
+        rendered. The last count is the +Inf bucket.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [
+                    [0] * (len(self.buckets) + 1), 0.0
+                ]
+            series[0][index] += 1
+            series[1] += value
+        _changed()
+
+    def dump(self):
+        return {**super().dump(), "buckets": list(self.buckets)}
+
+    @staticmethod
+    def copy_value(value):
+        return [list(value[0]), value[1]]
+
+    @staticmethod
+    def add_values(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+
+def snapshot():
+    """Values of this process, as written to METRICS_DIR."""
+    with _lock:
+        return {name: metric.dump() for name, metric in _metrics.items()}
+
+
+def _changed():
+    """Schedule a flush unless one is pending."""
+    global _flush_timer
+    if _flush_timer is None and settings.METRICS_DIR:
+        with _lock:
+            if _flush_timer is None:
+                _flush_timer = threading.Timer(
+                    settings.METRICS_FLUSH_INTERVAL, flush
+                )
+                _flush_timer.daemon = True
+                _flush_timer.start()
+
+
+def flush():
+    """Write the values of this process to its file in METRICS_DIR."""
+    global _flush_timer, _filename
+    if not settings.configured or not settings.METRICS_DIR:
+        return
+    with _lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        if _filename is None:
+            _filename = f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+    data = snapshot()
+    path = os.path.join(settings.METRICS_DIR, _filename)
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(data, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def collect():
+    """Values of all processes, summed per series."""
+    if not settings.METRICS_DIR:
+        return snapshot()
+    flush()
+    families, values = {}, {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.json")):
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, family in data.items():
+            merged = families.setdefault(name, family)
+            if merged.get("buckets") != family.get("buckets"):
+                # The bucket layout changed since this file was written
+                continue
+            add = (
+                Histogram if family["type"] == "histogram" else Counter
+            ).add_values
+            series = values.setdefault(name, {})
+            for labels, value in family["values"]:
+                labels = tuple(labels)
+                series[labels] = (
+                    add(series[labels], value) if labels in series else value
+                )
+    for name, family in families.items():
+        family["values"] = [
+            [list(labels), value] for labels, value in values[name].items()
+        ]
+    return families
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return (
+        str(value).replace("\\", r"\\").replace("\n", r"\n")
+        .replace('"', r"\"")
+    )
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(
+        f'{name}="{_escape(value)}"' for name, value in pairs
+    ) + "}"
+
+
+def render(families):
+    """Prometheus text exposition format 0.0.4 of `families`."""
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(
+            f"# HELP {name} "
+            + family["help"].replace("\\", r"\\").replace("\n", r"\n")
+        )
+        lines.append(f"# TYPE {name} {family['type']}")
+        for labels, value in sorted(family["values"]):
+            pairs = list(zip(family["labelnames"], labels))
+            if family["type"] != "histogram":
+                lines.append(
+                    f"{name}{_format_labels(pairs)} {_format_value(value)}"
+                )
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip([*family["buckets"], math.inf], counts):
+                cumulative += count
+                le = _format_labels([*pairs, ("le", _format_value(bound))])
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            lines.append(
+                f"{name}_sum{_format_labels(pairs)} {_format_value(total)}"
+            )
+            lines.append(f"{name}_count{_format_labels(pairs)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Forget the values of this process, e.g. in a forked child."""
+    global _lock, _flush_timer, _filename
+    _lock = threading.Lock()
+    _flush_timer = None
+    _filename = None
+    for metric in _metrics.values():
+        metric.values = {}
+
+
+# A forked child starts from zero; its parent reports its own values
+os.register_at_fork(after_in_child=reset)
+atexit.register(flush)
+
+
+http_requests = Counter(
+    "http_requests_total",
+    "Finished HTTP requests.",
+    ("view", "action", "status"),
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to returning its response.",
+    ("view", "action"),
+)
+http_request_db_duration = Histogram(
+    "http_request_db_duration_seconds",
+    "Time a request spent running SQL.",
+    ("view", "action"),
+)
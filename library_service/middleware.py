@@ -0,0 +1,187 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from library_service import metrics
+from library_service.instrumentation import QueryStats
+from library_service.routers import RequestRouting
+
+sql_logger = logging.getLogger("library_service.sql")
+
+ASYNC_URLCONF = "library_service.async_urls"
+SAFE_METHODS = ("GET", "HEAD")
+REPLICA_METHODS = ("GET", "HEAD", "OPTIONS")
+PIN_COOKIE = "use_primary"
+
+
+def view_labels(request):
+    """Metric labels naming the view and action that served `request`.
+
+    DRF viewsets report their action, other class-based views an
+    `action` attribute or the HTTP method. Requests that matched no URL
+    share empty labels, so scanners cannot create new series.
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "", ""
+    func = match.func
+    view = getattr(func, "cls", None) or getattr(func, "view_class", None)
+    actions = getattr(func, "actions", None)
+    if actions:
+        action = actions.get(request.method.lower(), "")
+    else:
+        action = getattr(view, "action", None) or request.method.lower()
+    return (view.__name__ if view else match.view_name), action
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Count requests and time them per view, action and status."""
+
+    def finish(request, start, response):
+        labels = view_labels(request)
+        metrics.http_requests.inc(*labels, str(response.status_code))
+        metrics.http_request_duration.observe(
+            time.perf_counter() - start, *labels
+        )
+        stats = getattr(request, "query_stats", None)
+        if stats is not None:
+            metrics.http_request_db_duration.observe(stats.duration, *labels)
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            start = time.perf_counter()
+            response = await get_response(request)
+            return finish(request, start, response)
+    else:
+        def middleware(request):
+            start = time.perf_counter()
+            response = get_response(request)
+            return finish(request, start, response)
+
+    return middleware
+
+
+@sync_and_async_middleware
+def query_stats_middleware(get_response):
+    """Report the SQL of every request.
+
+    Adds a Server-Timing header with the query count, the total SQL time
+    and the slowest statement's time, and logs the same as one JSON line:
+    at INFO level, or WARNING once the SQL took SQL_SLOW_REQUEST_MS. The
+    slowest statement is logged without its parameters. Queries run
+    while a streaming response is consumed are not counted. The stats
+    stay on `request.query_stats` for the middleware above.
+    """
+
+    def finish(request, stats, response):
+        response["Server-Timing"] = stats.server_timing()
+        sql_time = stats.duration * 1000
+        level = (
+            logging.WARNING if sql_time >= settings.SQL_SLOW_REQUEST_MS
+            else logging.INFO
+        )
+        if sql_logger.isEnabledFor(level):
+            sql_logger.log(level, json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "queries": stats.count,
+                "sql_ms": round(sql_time, 2),
+                "slowest_ms": round(stats.slowest_duration * 1000, 2),
+                "slowest_sql": stats.slowest,
+            }))
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats = request.query_stats = QueryStats()
+            token = stats.activate()
+            try:
+                response = await get_response(request)
+            finally:
+                stats.deactivate(token)
+            return finish(request, stats, response)
+    else:
+        def middleware(request):
+            stats = request.query_stats = QueryStats()
+            token = stats.activate()
+            try:
+                response = get_response(request)
+            finally:
+                stats.deactivate(token)
+            return finish(request, stats, response)
+
+    return middleware
+
+
+@sync_and_async_middleware
+def async_read_middleware(get_response):
+    """Resolve GET and HEAD with the async urlconf under ASGI.
+
+    Django builds an async middleware chain only for the ASGI handler,
+    so WSGI requests always reach the DRF viewsets.
+    """
+    if not iscoroutinefunction(get_response):
+        return get_response
+
+    async def middleware(request):
+        if settings.ASYNC_READ_VIEWS and request.method in SAFE_METHODS:
+            request.urlconf = ASYNC_URLCONF
+        return await get_response(request)
+
+    return middleware
+
+
+@sync_and_async_middleware
+def replica_middleware(get_response):
+    """Let safe-method requests read from a replica.
+
+    A client whose request wrote reads from the primary for the next
+    REPLICA_PIN_SECONDS, so it sees its own writes despite replica lag.
+    """
+
+    def start(request):
+        if (
+                request.method in REPLICA_METHODS
+                and PIN_COOKIE not in request.COOKIES
+        ):
+            return RequestRouting.for_replica()
+        return RequestRouting()
+
+    def finish(routing, response):
+        if routing.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            routing = start(request)
+            token = routing.activate()
+            try:
+                response = await get_response(request)
+            finally:
+                routing.deactivate(token)
+            return finish(routing, response)
+    else:
+        def middleware(request):
+            routing = start(request)
+            token = routing.activate()
+            try:
+                response = get_response(request)
+            finally:
+                routing.deactivate(token)
+            return finish(routing, response)
+
+    return middleware
@@ -0,0 +1,183 @@
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    CursorPagination,
+    PageNumberPagination,
+    _reverse_ordering,
+)
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key.
+
+    Every page is fetched with `WHERE id > <cursor> ORDER BY id LIMIT n`,
+    so deep pages cost the same as the first one.
+    """
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views.
+
+        The page is fetched with the async ORM.
+        """
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([obj async for obj in queryset])
+
+    def page_queryset(self, queryset, request, view=None):
+        """The rows of the requested page and the one following it.
+
+        Mirrors the first half of CursorPagination.paginate_queryset, with
+        the cursor position applied by filter_position().
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+        self.offset, self.reverse = offset, reverse
+        self.current_position = current_position
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = self.filter_position(queryset, current_position)
+
+        return queryset[offset:offset + self.page_size + 1]
+
+    def filter_position(self, queryset, position):
+        """Rows past `position` in the direction of the cursor."""
+        order = self.ordering[0]
+        is_reversed = order.startswith("-")
+        order_attr = order.lstrip("-")
+
+        if self.cursor.reverse != is_reversed:
+            kwargs = {order_attr + "__lt": position}
+        else:
+            kwargs = {order_attr + "__gt": position}
+
+        return queryset.filter(**kwargs)
+
+    def set_page(self, results):
+        """The second half of CursorPagination.paginate_queryset."""
+        current_position = self.current_position
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if self.reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (
+                (current_position is not None) or (self.offset > 0)
+            )
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (
+                (current_position is not None) or (self.offset > 0)
+            )
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+class RankCursorPagination(IdCursorPagination):
+    """Keyset pagination on a counter, ties broken by the primary key.
+
+    CursorPagination only keeps the first ordering field in its cursor and
+    steps over equal values with an offset, capped at offset_cutoff. Many
+    rows share a counter value, so here the position holds both values
+    and is unique: pages never need an offset, however long the ties.
+    A row whose counter changes between two requests can still move
+    across the cursor, but the other rows are neither skipped nor
+    repeated.
+
+    `ordering` is the counter and the primary key, in the same direction.
+    """
+
+    ordering = None
+
+    def _get_position_from_instance(self, instance, ordering):
+        return ",".join(
+            str(
+                instance[field] if isinstance(instance, dict)
+                else getattr(instance, field)
+            )
+            for field in (order.lstrip("-") for order in ordering)
+        )
+
+    def filter_position(self, queryset, position):
+        try:
+            counter, pk = (int(value) for value in position.split(","))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        counter_order, pk_order = self.ordering
+        counter_field = counter_order.lstrip("-")
+        pk_field = pk_order.lstrip("-")
+        is_reversed = counter_order.startswith("-")
+        lookup = "lt" if self.cursor.reverse != is_reversed else "gt"
+
+        # The redundant bound on the counter alone lets the database
+        # range-scan the (counter, pk) index.
+        return queryset.filter(
+            Q(**{f"{counter_field}__{lookup}e": counter}),
+            Q(**{f"{counter_field}__{lookup}": counter})
+            | Q(**{counter_field: counter, f"{pk_field}__{lookup}": pk}),
+        )
+
+
+class NewestFirstCursorPagination(IdCursorPagination):
+    ordering = "-id"
+
+
+class MostBorrowedCursorPagination(RankCursorPagination):
+    ordering = ("-total_borrowings", "-pk")
+
+
+class MostActiveCursorPagination(RankCursorPagination):
+    ordering = ("-active_borrowings", "-pk")
+
+
+class SearchPagination(PageNumberPagination):
+    """Relevance-ranked results have no stable keyset, so use page numbers."""
+
+    page_size_query_param = "page_size"
+    max_page_size = 100
@@ -0,0 +1,80 @@
+"""Route the reads of safe-method requests to a read replica.
+
+Replicas are the database aliases in settings.DATABASE_REPLICAS.
+replica_middleware picks one for each GET, HEAD and OPTIONS request,
+and ReplicaRouter sends that request's reads there. Everything else
+reads from the primary: unsafe requests, code running outside of a
+request, and every read of a request after its first write
+(read-your-writes), since a replica may lag behind. Writes always go
+to the primary.
+
+Data kept for other requests, such as the catalog cache (and the ETags
+derived from its version) or the cached user behind a token, is read
+from the primary with read_from_primary(). A lagging replica would
+otherwise store stale rows under the current version.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_routing = ContextVar("routing", default=None)
+
+
+class RequestRouting:
+    """Database choice of one request, shared with threads it spawns."""
+
+    def __init__(self, read_db=DEFAULT_DB_ALIAS):
+        self.read_db = read_db
+        self.wrote = False
+
+    @classmethod
+    def for_replica(cls):
+        replicas = settings.DATABASE_REPLICAS
+        return cls(random.choice(replicas) if replicas else DEFAULT_DB_ALIAS)
+
+    def activate(self):
+        return _routing.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _routing.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    """Read from the primary within the block, whatever the request chose."""
+    routing = _routing.get()
+    if routing is None:
+        yield
+        return
+
+    read_db = routing.read_db
+    routing.read_db = DEFAULT_DB_ALIAS
+    try:
+        yield
+    finally:
+        if not routing.wrote:
+            routing.read_db = read_db
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        return routing.read_db if routing else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing:
+            routing.read_db = DEFAULT_DB_ALIAS
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
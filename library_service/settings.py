@@ -11,8 +11,11 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
 from datetime import timedelta
+from decimal import Decimal
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 from dotenv import load_dotenv
 
@@ -45,10 +48,15 @@ INSTALLED_APPS = [
     "user",
     "books",
     "borrowings",
-    "drf_spectacular"
+    "drf_spectacular",
+    "library_service",
 ]
 
 MIDDLEWARE = [
+    "library_service.middleware.metrics_middleware",
+    "library_service.middleware.query_stats_middleware",
+    "library_service.middleware.async_read_middleware",
+    "library_service.middleware.replica_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -60,6 +68,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "library_service.urls"
 
+# Under ASGI, answer GET and HEAD of the hot read endpoints with native
+# async views (see library_service.async_urls)
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "True") == "True"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -84,10 +96,123 @@ WSGI_APPLICATION = "library_service.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "ENGINE": "library_service.sqlite3",
+        "NAME": os.getenv("DATABASE_NAME", BASE_DIR / "db.sqlite3"),
+        "OPTIONS": {
+            # Run on every new connection. WAL lets readers work while a
+            # write is in progress; synchronous=normal is durable in WAL
+            # mode except for the last commits on power loss.
+            "pragmas": {
+                "journal_mode": "wal",
+                "synchronous": "normal",
+                # Negative sizes are KiB: a 16 MiB page cache per connection
+                "cache_size": -16000,
+                "mmap_size": 256 * 1024 * 1024,
+                # Milliseconds to wait for a lock before "database is locked"
+                "busy_timeout": int(os.getenv("DATABASE_BUSY_TIMEOUT", 5000)),
+            },
+        },
+        "TEST": {
+            # A file-backed test database lets concurrent test connections
+            # wait on each other's locks like in production.
+            "NAME": BASE_DIR / "test_db.sqlite3",
+        },
+    }
+}
+
+
+# Read replicas as space-separated SQLite files. Safe-method requests
+# read from one of them (see library_service.routers); copy the primary
+# into them with `python manage.py sync_replicas`.
+DATABASE_REPLICAS = [
+    f"replica{index}"
+    for index, _ in enumerate(os.getenv("DATABASE_REPLICAS", "").split(), 1)
+]
+for alias, name in zip(
+        DATABASE_REPLICAS, os.getenv("DATABASE_REPLICAS", "").split()
+):
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": name,
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["library_service.routers.ReplicaRouter"]
+
+# Seconds a client reads from the primary after one of its requests wrote
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 10))
+
+
+# Metrics, served at /metrics to staff (see library_service.metrics).
+# With several worker processes, point METRICS_DIR at a directory they
+# share; each process writes its values there at most
+# METRICS_FLUSH_INTERVAL seconds after they change.
+METRICS_DIR = os.getenv("METRICS_DIR") or None
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 1))
+
+# Logging
+# library_service.sql logs the SQL of each request as a JSON line (see
+# library_service.middleware.query_stats_middleware): at INFO, or at
+# WARNING once the request spent SQL_SLOW_REQUEST_MS in SQL.
+SQL_SLOW_REQUEST_MS = int(os.getenv("SQL_SLOW_REQUEST_MS", 200))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "library_service.sql": {
+            "handlers": ["console"],
+            "level": os.getenv("SQL_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+    },
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# locmem is per process; use a shared backend when running several workers
+# so catalog invalidation reaches all of them. library_service.gunicorn_conf
+# selects the file backend for more than one worker. redis (needs the redis
+# package) and memcached (pymemcache) are shared between hosts as well.
+
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "memcached": "django.core.cache.backends.memcached.PyMemcacheCache",
+}
+CACHE_LOCATIONS = {
+    "locmem": "library",
+    "file": BASE_DIR / ".cache",
+    "redis": "redis://127.0.0.1:6379",
+    "memcached": "127.0.0.1:11211",
+}
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND],
+        "LOCATION": os.getenv(
+            "CACHE_LOCATION", CACHE_LOCATIONS[CACHE_BACKEND]
+        ),
     }
 }
+if CACHE_BACKEND in ("locmem", "file"):
+    # The file backend lists its whole directory to cull it on every
+    # write, so it keeps far fewer entries
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": 10000 if CACHE_BACKEND == "locmem" else 1000
+    }
+
+BOOK_CACHE_TIMEOUT = int(os.getenv("BOOK_CACHE_TIMEOUT", 300))
+
+# Seconds an authenticated user is served from the cache
+USER_CACHE_TIMEOUT = int(os.getenv("USER_CACHE_TIMEOUT", 60))
 
 
 # Password validation
@@ -135,11 +260,43 @@ AUTH_USER_MODEL = "user.User"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user.authentication.CachedJWTAuthentication',
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "library_service.pagination.IdCursorPagination",
+    "PAGE_SIZE": int(os.getenv("API_PAGE_SIZE", 20)),
+    "DEFAULT_THROTTLE_CLASSES": (
+        "library_service.throttling.BucketThrottle",
+    ),
+    # Token-bucket rates; set a variable to an empty string for no limit
+    "DEFAULT_THROTTLE_RATES": {
+        "user": os.getenv("THROTTLE_USER_RATE", "1200/min") or None,
+        "anon": os.getenv("THROTTLE_ANON_RATE", "120/min") or None,
+        "borrowing_create": os.getenv(
+            "THROTTLE_BORROWING_CREATE_RATE", "30/min"
+        ) or None,
+        "token_obtain": os.getenv(
+            "THROTTLE_TOKEN_OBTAIN_RATE", "10/min"
+        ) or None,
+        "register": os.getenv("THROTTLE_REGISTER_RATE", "10/hour") or None,
+    },
+    # Reverse proxies in front of the app. Clients are identified by the
+    # address this many hops back in X-Forwarded-For; with 0 the header,
+    # which any client can set, is ignored.
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", 0)),
 }
 
+# "local" (per process) or "cache" (shared through CACHES). Buckets are
+# written on every request, which the file backend cannot afford.
+THROTTLE_BACKEND = os.getenv("THROTTLE_BACKEND", "local")
+if THROTTLE_BACKEND == "cache" and CACHE_BACKEND == "file":
+    raise ImproperlyConfigured(
+        "THROTTLE_BACKEND=cache writes to the cache on every request; "
+        "use CACHE_BACKEND=redis or memcached, or THROTTLE_BACKEND=local"
+    )
+
+TEST_RUNNER = "library_service.testing.TestRunner"
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Library Service API",
     "DESCRIPTION": "Borrowing library books",
@@ -159,3 +316,12 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
     "AUTH_HEADER_NAME": "HTTP_AUTHORIZE",
 }
+
+# Overdue days are charged at daily_fee times this multiplier
+FINE_MULTIPLIER = Decimal(os.getenv("FINE_MULTIPLIER", "2"))
+
+NOTIFIER_BACKEND = os.getenv("NOTIFIER_BACKEND", "telegram")
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT__TOKEN")
+
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
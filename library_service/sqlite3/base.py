@@ -0,0 +1,38 @@
+"""
+SQLite backend with per-connection PRAGMAs and BEGIN IMMEDIATE.
+
+    "ENGINE": "library_service.sqlite3",
+    "OPTIONS": {"pragmas": {"journal_mode": "wal", "busy_timeout": 5000}},
+
+Every new connection runs the PRAGMAs in OPTIONS["pragmas"]; the other
+options are passed to sqlite3.connect() as usual.
+
+A deferred BEGIN takes the write lock only at the first write. When
+another connection commits in between, SQLite cannot upgrade the read
+snapshot and fails with "database is locked" at once, without waiting
+for busy_timeout. Transactions opened by
+library_service.transaction.immediate_atomic() therefore start with
+BEGIN IMMEDIATE, which waits for the write lock up front.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    begin_immediate = False
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop("pragmas", {})
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.begin_immediate:
+            self.cursor().execute("BEGIN IMMEDIATE")
+        else:
+            super()._start_transaction_under_autocommit()
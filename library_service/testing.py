@@ -0,0 +1,88 @@
+"""Test clients that hold every request to a query budget.
+
+Budgets map "<METHOD> <url name>" to the most queries a request to that
+endpoint may run, counting savepoints and queries of async views:
+
+    QUERY_BUDGETS = {"GET book:book-list": 2}
+    client = QueryBudgetClient(QUERY_BUDGETS)
+
+A request over its budget, or to an endpoint without one, fails the test
+with the statements it ran. Queries run while a streaming response is
+consumed are not counted.
+
+TestRunner, the project's TEST_RUNNER, isolates tests from each other's
+throttling and keeps the per-request SQL log quiet.
+"""
+import logging
+
+from django.test import AsyncClient
+from django.test.runner import DiscoverRunner
+from django.test.utils import iter_test_cases
+from django.urls import Resolver404
+from rest_framework.test import APIClient
+
+from library_service import throttling
+from library_service.instrumentation import QueryStats
+
+
+class QueryBudgetMixin:
+    def __init__(self, query_budgets, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_budgets = query_budgets
+
+    def check_query_budget(self, method, response, stats):
+        try:
+            endpoint = f"{method} {response.resolver_match.view_name}"
+        except Resolver404:
+            return
+        budget = self.query_budgets.get(endpoint)
+        if budget is None:
+            raise AssertionError(f"No query budget for {endpoint}")
+        if stats.count > budget:
+            queries = "\n".join(
+                f"{number}. {sql}"
+                for number, sql in enumerate(stats.statements, 1)
+            )
+            raise AssertionError(
+                f"{endpoint} ran {stats.count} queries, budget is "
+                f"{budget}:\n{queries}"
+            )
+
+
+class QueryBudgetClient(QueryBudgetMixin, APIClient):
+    def request(self, **request):
+        with QueryStats(keep_statements=True) as stats:
+            response = super().request(**request)
+        self.check_query_budget(request["REQUEST_METHOD"], response, stats)
+        return response
+
+
+class AsyncQueryBudgetClient(QueryBudgetMixin, AsyncClient):
+    async def request(self, **request):
+        with QueryStats(keep_statements=True) as stats:
+            response = await super().request(**request)
+        self.check_query_budget(request["method"], response, stats)
+        return response
+
+
+class TestRunner(DiscoverRunner):
+    """Starts every test with empty LocalBucketStore throttle buckets.
+
+    Buckets outlive the rollback between tests and are keyed by user pk
+    or client IP, which the next test reuses, so without this a test
+    could be throttled by the requests of the tests run before it.
+
+    The library_service.sql logger is raised to CRITICAL: tests that wait
+    on a write lock on purpose would otherwise log every request as slow.
+    assertLogs still captures it, since it lowers the level while active.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        logging.getLogger("library_service.sql").setLevel(logging.CRITICAL)
+
+    def build_suite(self, *args, **kwargs):
+        suite = super().build_suite(*args, **kwargs)
+        for test in iter_test_cases(suite):
+            test.addCleanup(throttling.reset_bucket_store)
+        return suite
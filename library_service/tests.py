@@ -0,0 +1,305 @@
+from datetime import timedelta
+from io import StringIO
+import json
+import os
+import tempfile
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, router, transaction
+from django.db.models import Count, F, Q
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from books.models import Book
+from books.tests import sample_book
+from books.views import BookViewSet
+from borrowings import outbox, stats
+from borrowings.models import Borrowing, Notification
+from borrowings.notifiers import InMemoryNotifier
+from borrowings.tests import (
+    BORROWING_URL,
+    QUERY_BUDGETS as BORROWING_QUERY_BUDGETS,
+    sample_borrowing,
+    sample_user,
+    statements,
+)
+from library_service import metrics
+from library_service.middleware import PIN_COOKIE, replica_middleware
+from library_service.testing import QueryBudgetClient
+from library_service.transaction import immediate_atomic
+from user.authentication import CachedJWTAuthentication
+
+
+METRICS_URL = reverse("metrics")
+
+QUERY_BUDGETS = {**BORROWING_QUERY_BUDGETS, "GET metrics": 0}
+
+
+class SQLiteBackendTest(TransactionTestCase):
+    def test_connection_pragmas(self):
+        values = {}
+        with connection.cursor() as cursor:
+            for pragma in ("journal_mode", "synchronous", "busy_timeout"):
+                cursor.execute(f"PRAGMA {pragma}")
+                values[pragma] = cursor.fetchone()[0]
+
+        self.assertEqual(
+            values,
+            {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000}
+        )
+
+    def test_immediate_atomic_begins_immediate(self):
+        with CaptureQueriesContext(connection) as queries:
+            with immediate_atomic():
+                with immediate_atomic():
+                    Book.objects.exists()
+            with transaction.atomic():
+                Book.objects.exists()
+
+        self.assertEqual(
+            [sql for sql in statements(queries) if sql.startswith("BEGIN")],
+            ["BEGIN IMMEDIATE", "BEGIN"]
+        )
+
+    def test_concurrent_writer_waits_for_lock(self):
+        book = sample_book(inventory=2)
+
+        def writer():
+            try:
+                with immediate_atomic():
+                    Book.objects.take_copy(book.pk)
+            finally:
+                connection.close()
+
+        with immediate_atomic():
+            Book.objects.take_copy(book.pk)
+            thread = threading.Thread(target=writer)
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+        thread.join()
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRoutingTest(TestCase):
+    def routed(self, request):
+        """Read databases a view sees before and after it writes."""
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Book))
+            sample_book()
+            seen.append(router.db_for_read(Book))
+            return HttpResponse()
+
+        response = replica_middleware(view)(request)
+        return seen, response
+
+    def test_safe_request_reads_replica_until_it_writes(self):
+        seen, response = self.routed(RequestFactory().get("/"))
+
+        self.assertEqual(seen, ["replica1", "default"])
+        self.assertEqual(
+            response.cookies[PIN_COOKIE]["max-age"],
+            settings.REPLICA_PIN_SECONDS
+        )
+
+    def test_unsafe_and_pinned_requests_read_primary(self):
+        factory = RequestFactory()
+        pinned = factory.get("/")
+        pinned.COOKIES[PIN_COOKIE] = "1"
+
+        for request in (factory.post("/"), pinned):
+            seen, _ = self.routed(request)
+            self.assertEqual(seen, ["default", "default"])
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(router.db_for_read(Book), "default")
+        self.assertEqual(router.db_for_write(Book), "default")
+        self.assertFalse(router.allow_migrate("replica1", "books"))
+
+    async def test_async_request_sees_writes_of_sync_code(self):
+        seen = []
+
+        async def view(request):
+            seen.append(router.db_for_read(Book))
+            await sync_to_async(sample_book)()
+            seen.append(router.db_for_read(Book))
+            return HttpResponse()
+
+        response = await replica_middleware(view)(RequestFactory().get("/"))
+
+        self.assertEqual(seen, ["replica1", "default"])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_cached_data_is_read_from_primary_after_a_write(self):
+        # A lagging replica would cache rows predating the new version
+        book = sample_book()
+        user = sample_user()
+        token = AccessToken.for_user(user)
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Book))
+            response = BookViewSet.as_view({"get": "retrieve"})(
+                request, pk=book.pk
+            )
+            seen.append(router.db_for_read(Book))
+            seen.append(CachedJWTAuthentication().get_user(token))
+            seen.append(router.db_for_read(Book))
+            return response
+
+        with CaptureQueriesContext(connection) as queries:
+            response = replica_middleware(view)(RequestFactory().get("/"))
+
+        self.assertEqual(seen, ["replica1", "replica1", user, "replica1"])
+        self.assertEqual(response.data["id"], book.pk)
+        self.assertEqual(len(queries), 2)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.client = QueryBudgetClient(QUERY_BUDGETS)
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+
+    def test_metrics_are_staff_only(self):
+        self.assertEqual(
+            self.client.get(METRICS_URL).status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+
+        self.client.force_authenticate(sample_user(is_staff=True))
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+
+    def test_requests_are_counted_per_action_and_status(self):
+        sample_borrowing(user=self.user)
+        labels = ("BorrowingViewSet", "list")
+        before = metrics.http_requests.values.get((*labels, "200"), 0)
+
+        self.client.get(BORROWING_URL)
+        self.client.force_authenticate(sample_user(is_staff=True))
+        body = self.client.get(METRICS_URL).content.decode()
+
+        self.assertEqual(
+            metrics.http_requests.values[(*labels, "200")], before + 1
+        )
+        self.assertIn(
+            'http_requests_total{view="BorrowingViewSet",action="list",'
+            f'status="200"}} {before + 1}',
+            body
+        )
+        self.assertIn(
+            'http_request_db_duration_seconds_bucket{view="BorrowingViewSet",'
+            'action="list",le="+Inf"}',
+            body
+        )
+
+    def test_notifier_outcomes_are_recorded(self):
+        Notification.objects.enqueue("first")
+        Notification.objects.enqueue("second")
+        # Counts of the live histogram would grow along with it
+        errors = sum(
+            outbox.notifier_sends.values.get(("error",), [[0], 0])[0]
+        )
+        retried = outbox.notifications.values.get(("retried",), 0)
+
+        outbox.deliver_pending(InMemoryNotifier(fail_times=1))
+
+        self.assertEqual(
+            sum(outbox.notifier_sends.values[("error",)][0]),
+            errors + 1
+        )
+        self.assertEqual(
+            outbox.notifications.values[("retried",)], retried + 1
+        )
+
+    def test_collect_sums_the_files_of_all_processes(self):
+        labels = ["BookViewSet", "list", "200"]
+        own = metrics.http_requests.values.get(tuple(labels), 0)
+        other = metrics.snapshot()
+        other["http_requests_total"]["values"] = [[labels, 5]]
+
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "1-other.json"), "w") as file:
+                json.dump(other, file)
+            with override_settings(METRICS_DIR=directory):
+                families = metrics.collect()
+                files = sorted(os.listdir(directory))
+
+        self.assertEqual(len(files), 2)
+        self.assertIn(
+            [labels, own + 5], families["http_requests_total"]["values"]
+        )
+        self.assertIn(
+            'http_requests_total{view="BookViewSet",action="list",'
+            f'status="200"}} {own + 5}',
+            metrics.render(families)
+        )
+
+
+class SeedCommandTest(TestCase):
+    def seed(self, **options):
+        options = {"books": 40, "users": 10, "borrowings": 300, **options}
+        call_command("seed", stdout=StringIO(), **options)
+
+    def test_seed_fills_tables_with_valid_rows(self):
+        self.seed()
+
+        self.assertEqual(Book.objects.count(), 40)
+        self.assertEqual(get_user_model().objects.count(), 10)
+        self.assertEqual(Borrowing.objects.count(), 300)
+        active = Borrowing.objects.filter(actual_return_date__isnull=True)
+        self.assertTrue(0 < active.count() < 100)
+        self.assertFalse(
+            Borrowing.objects.filter(
+                Q(actual_return_date__gt=timezone.localdate())
+                | Q(actual_return_date__lt=F("borrow_date"))
+                | Q(expected_return_date__lt=F("borrow_date"))
+                | Q(expected_return_date__gt=F("borrow_date") + timedelta(14))
+            ).exists()
+        )
+        user = get_user_model().objects.first()
+        self.assertTrue(user.check_password("password"))
+        self.assertEqual(user.username, user.email)
+        self.assertEqual(
+            stats.reconcile(dry_run=True), {"books": 0, "users": 0}
+        )
+
+    def test_popular_books_get_most_borrowings(self):
+        self.seed(zipf=1.5)
+
+        counts = sorted(
+            Borrowing.objects.values("book_id").annotate(
+                total=Count("id")
+            ).values_list("total", flat=True),
+            reverse=True
+        )
+        self.assertGreater(counts[0], 300 * 0.25)
+
+    def test_seed_tops_up_to_totals(self):
+        self.seed()
+        self.seed(borrowings=350)
+
+        self.assertEqual(Book.objects.count(), 40)
+        self.assertEqual(Borrowing.objects.count(), 350)
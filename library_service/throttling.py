@@ -0,0 +1,177 @@
+"""Token-bucket request throttling.
+
+A rate such as "100/min" gives every client a bucket of 100 tokens that
+refills at 100 per minute. Each request takes one token, so short bursts
+up to the bucket size pass and sustained traffic is held to the rate.
+A rate of None means unlimited.
+
+Buckets live in a store selected by THROTTLE_BACKEND:
+    "local"  a dict in this process; cheapest, but every worker process
+             keeps its own buckets
+    "cache"  the default Django cache, shared between processes when the
+             cache is; the read-modify-write is not atomic, so concurrent
+             workers can let a few extra requests through
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+BACKENDS = {
+    "local": "library_service.throttling.LocalBucketStore",
+    "cache": "library_service.throttling.CacheBucketStore",
+}
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """Return (bucket size, tokens per second) for a rate like "10/min"."""
+    if rate is None:
+        return None
+    num, period = rate.split("/")
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class LocalBucketStore:
+    """Buckets in a dict of this process.
+
+    The fast path takes no lock: under the GIL a race between two threads
+    of one worker can at worst let one extra request through, the same
+    trade-off CacheBucketStore makes between processes.
+    """
+    MAX_BUCKETS = 100_000
+
+    def __init__(self):
+        self.buckets = {}
+        self.prune_lock = threading.Lock()
+
+    def consume(self, key, capacity, refill):
+        """Take a token from the bucket of `key`.
+
+        Returns 0 when the request is allowed, otherwise the seconds
+        until the next token.
+        """
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.MAX_BUCKETS:
+                self.prune(now)
+            bucket = self.buckets[key] = [capacity, now, capacity / refill]
+        else:
+            bucket[0] += (now - bucket[1]) * refill
+            if bucket[0] > capacity:
+                bucket[0] = capacity
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / refill
+
+    def prune(self, now):
+        """Forget buckets that have refilled completely.
+
+        A full bucket behaves exactly like a missing one, so no client
+        gains tokens from being forgotten.
+        """
+        with self.prune_lock:
+            self.buckets = {
+                key: bucket for key, bucket in list(self.buckets.items())
+                if bucket[1] + bucket[2] > now
+            }
+
+
+class CacheBucketStore:
+    KEY_PREFIX = "throttle:"
+
+    def consume(self, key, capacity, refill):
+        now = time.time()
+        key = self.KEY_PREFIX + ":".join(map(str, key))
+        tokens, last = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - last) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(key, (tokens, now), math.ceil(capacity / refill))
+        return 0 if allowed else (1 - tokens) / refill
+
+
+_store = None
+_rates = None
+_lock = threading.Lock()
+
+
+def get_rate(scope):
+    """Parsed rate of `scope`, or None if it is unlimited."""
+    global _rates
+    if _rates is None:
+        _rates = {
+            name: parse_rate(rate)
+            for name, rate in api_settings.DEFAULT_THROTTLE_RATES.items()
+        }
+    return _rates.get(scope)
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                backend = settings.THROTTLE_BACKEND
+                _store = import_string(BACKENDS.get(backend, backend))()
+    return _store
+
+
+def reset_bucket_store(**kwargs):
+    global _store, _rates
+    if kwargs.get("setting") in (None, "THROTTLE_BACKEND", "REST_FRAMEWORK"):
+        _store = None
+        _rates = None
+
+
+setting_changed.connect(reset_bucket_store)
+
+
+def consume(store, scope, ident):
+    """Seconds until `ident` may make a request of `scope`, 0 if now."""
+    rate = get_rate(scope)
+    if rate is None:
+        return 0
+    return store.consume((scope, ident), rate[0], rate[1])
+
+
+class BucketThrottle(BaseThrottle):
+    """All token buckets of a request, checked in one pass.
+
+    Authenticated users take a token from their "user" bucket, other
+    clients from the "anon" bucket of their IP address (see NUM_PROXIES).
+    Views and actions with a `throttle_scope` also take one from that
+    scope's bucket of the same user or address. Rates come from
+    REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"][scope].
+    """
+    retry_after = None
+
+    def allow_request(self, request, view):
+        user = request.user
+        if user is not None and user.is_authenticated:
+            scope, ident = "user", user.pk
+        else:
+            scope, ident = "anon", self.get_ident(request)
+        store = get_bucket_store()
+
+        wait = consume(store, scope, ident)
+        scope = getattr(view, "throttle_scope", None)
+        if scope is not None:
+            wait = max(wait, consume(store, scope, ident))
+        self.retry_after = wait
+        return not wait
+
+    def wait(self):
+        return self.retry_after
@@ -0,0 +1,32 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+class ImmediateAtomic(transaction.Atomic):
+    """Atomic that opens its transaction with BEGIN IMMEDIATE.
+
+    Only the outermost block starts a transaction; nested blocks behave
+    like atomic(). Backends other than library_service.sqlite3 ignore
+    the flag and BEGIN as usual.
+    """
+
+    def __enter__(self):
+        connection = transaction.get_connection(self.using)
+        outermost = not connection.in_atomic_block
+        if outermost:
+            connection.begin_immediate = True
+        try:
+            super().__enter__()
+        finally:
+            if outermost:
+                connection.begin_immediate = False
+
+
+def immediate_atomic(using=None, savepoint=True, durable=False):
+    """transaction.atomic() for transactions that will write.
+
+    Taking the write lock when the transaction starts lets SQLite queue
+    concurrent writers on busy_timeout instead of failing one of them.
+    """
+    if callable(using):
+        return ImmediateAtomic(DEFAULT_DB_ALIAS, savepoint, durable)(using)
+    return ImmediateAtomic(using, savepoint, durable)
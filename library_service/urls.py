@@ -22,6 +22,8 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
+from library_service.views import MetricsView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/user/", include("user.urls", namespace="user")),
@@ -38,4 +40,5 @@ urlpatterns = [
         SpectacularRedocView.as_view(url_name="schema"),
         name="redoc",
     ),
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ]
@@ -0,0 +1,37 @@
+"""Version counters in the default cache, one per set of cached data.
+
+Readers build cache keys and ETags from the current version; writers bump
+it, so everything derived from an older version is ignored from then on.
+Reading a version costs one cache get and no query.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 1, so a version key evicted by
+        # the cache can never come back as a value used before.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(key)
+
+
+def invalidate(key):
+    """Bump the version right away and again on commit.
+
+    The first bump makes the writer's own reads miss, the second discards
+    data derived from pre-commit rows by concurrent readers.
+    """
+    bump_version(key)
+    transaction.on_commit(lambda: bump_version(key))
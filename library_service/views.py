@@ -0,0 +1,18 @@
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+from library_service import metrics
+
+
+class MetricsView(APIView):
+    """Metrics of all worker processes in the Prometheus text format."""
+
+    permission_classes = (IsAdminUser,)
+    schema = None
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.render(metrics.collect()),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
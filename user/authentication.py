@@ -0,0 +1,146 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from library_service.routers import read_from_primary
+
+KEY_PREFIX = "user:principal:"
+# What permissions, queries by user and the profile endpoint read. The
+# password hash is never cached; other fields are loaded on access.
+PRINCIPAL_FIELDS = (
+    "id",
+    "email",
+    "username",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+)
+
+
+def principal_key(user_id):
+    return f"{KEY_PREFIX}{user_id}"
+
+
+def dump_principal(user):
+    """The cached form of a user: PRINCIPAL_FIELDS and a password digest."""
+    principal = {name: getattr(user, name) for name in PRINCIPAL_FIELDS}
+    principal["password_digest"] = get_md5_hash_password(user.password)
+    return principal
+
+
+def load_principal(user_model, principal):
+    """A user instance with the other fields deferred.
+
+    Saving it writes only the cached fields, so it never blanks the
+    password or anything else that was left out.
+    """
+    # from_db() expects the values in field order
+    names = [
+        field.attname for field in user_model._meta.concrete_fields
+        if field.attname in principal
+    ]
+    return user_model.from_db(
+        DEFAULT_DB_ALIAS, names, [principal[name] for name in names]
+    )
+
+
+def invalidate_principal(user_id):
+    """Drop the cached user so the next request reloads it.
+
+    Deleted right away and again on commit, so a request that cached the
+    old row while the write was in flight does not keep it.
+    """
+    key = principal_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that caches the user behind a token.
+
+    simplejwt loads the user row on every request. Here the fields of the
+    loaded, active user in PRINCIPAL_FIELDS are kept in the default cache
+    for USER_CACHE_TIMEOUT seconds (locmem evicts the least recently used
+    entries), so polling clients cost one user query per timeout instead
+    of one per request. The cache, which may be a directory of files,
+    never holds the password hash, only an MD5 digest of it to reject
+    revoked tokens. Every read from the cache builds a fresh user, so a
+    view changing request.user never touches the cached one. Misses are
+    loaded from the primary, so a lagging replica never caches a stale
+    user.
+
+    Saving or deleting a user invalidates its entry (see user.signals).
+    Writes that bypass signals, such as QuerySet.update(), become visible
+    once the entry expires. The same applies to other processes when the
+    cache is not shared between them.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = principal_key(user_id)
+        principal = cache.get(key)
+        if principal is None:
+            with read_from_primary():
+                user = super().get_user(validated_token)
+            cache.set(
+                key, dump_principal(user), settings.USER_CACHE_TIMEOUT
+            )
+            return user
+
+        self.check_revoked(principal, validated_token)
+        return load_principal(self.user_model, principal)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            # Raises InvalidToken before any query
+            return super().get_user(validated_token)
+
+        key = principal_key(user_id)
+        principal = await cache.aget(key)
+        if principal is None:
+            with read_from_primary():
+                user = await sync_to_async(super().get_user)(
+                    validated_token
+                )
+            await cache.aset(
+                key, dump_principal(user), settings.USER_CACHE_TIMEOUT
+            )
+            return user
+
+        self.check_revoked(principal, validated_token)
+        return load_principal(self.user_model, principal)
+
+    @staticmethod
+    def check_revoked(principal, validated_token):
+        """Reject tokens issued before a password change of a cached user."""
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+        ) != principal["password_digest"]:
+            raise AuthenticationFailed(
+                "The user's password has been changed.",
+                code="password_changed"
+            )
@@ -0,0 +1,232 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from library_service.throttling import (
+    BucketThrottle,
+    CacheBucketStore,
+    LocalBucketStore,
+)
+from user.authentication import principal_key
+
+ME_URL = reverse("user:manage")
+REGISTER_URL = reverse("user:register")
+TOKEN_URL = reverse("user:token_obtain_pair")
+BOOK_URL = reverse("book:book-list")
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {
+            **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"], **rates
+        },
+    })
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "reader@test.com",
+            "password",
+            first_name="Reader"
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZE=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    def test_user_is_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+
+    def test_update_invalidates_cached_user(self):
+        self.client.get(ME_URL)
+
+        res = self.client.patch(ME_URL, {"first_name": "Changed"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.data["first_name"], "Changed")
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_is_a_copy(self):
+        self.client.get(ME_URL)
+        request = self.client.get(ME_URL).wsgi_request
+        request.user.first_name = "Mutated"
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.data["first_name"], "Reader")
+
+    def test_password_hash_is_not_cached(self):
+        self.client.get(ME_URL)
+
+        principal = cache.get(principal_key(self.user.pk))
+        self.assertEqual(principal["email"], self.user.email)
+        self.assertNotIn(self.user.password, repr(principal))
+
+    def test_saving_cached_user_keeps_other_fields(self):
+        self.client.get(ME_URL)
+
+        res = self.client.patch(ME_URL, {"first_name": "Changed"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Changed")
+        self.assertTrue(self.user.check_password("password"))
+
+    def test_cached_user_rejects_token_of_other_password(self):
+        # simplejwt modules keep the api_settings object they imported
+        with mock.patch(
+                "user.authentication.api_settings.CHECK_REVOKE_TOKEN", True
+        ):
+            self.client.credentials(
+                HTTP_AUTHORIZE=f"Bearer {AccessToken.for_user(self.user)}"
+            )
+            res = self.client.get(ME_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            self.user.password = "other"
+            self.client.credentials(
+                HTTP_AUTHORIZE=f"Bearer {AccessToken.for_user(self.user)}"
+            )
+            with self.assertNumQueries(0):
+                res = self.client.get(ME_URL)
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_user_model().objects.create_user("reader@test.com", "password")
+
+    @throttle_rates(token_obtain="3/min")
+    def test_token_obtain_is_throttled(self):
+        credentials = {"email": "reader@test.com", "password": "wrong"}
+        statuses = [
+            self.client.post(TOKEN_URL, credentials).status_code
+            for _ in range(4)
+        ]
+
+        self.assertEqual(statuses[:3], [status.HTTP_401_UNAUTHORIZED] * 3)
+        self.assertEqual(statuses[3], status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @throttle_rates(register="1/hour")
+    def test_register_is_throttled_with_retry_after(self):
+        self.client.post(
+            REGISTER_URL, {"email": "a@test.com", "password": "password"}
+        )
+        res = self.client.post(
+            REGISTER_URL, {"email": "b@test.com", "password": "password"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "3600")
+
+    @throttle_rates(anon="2/min")
+    def test_anonymous_requests_are_throttled_per_ip(self):
+        for _ in range(2):
+            self.client.get(BOOK_URL)
+
+        res = self.client.get(BOOK_URL)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        res = self.client.get(BOOK_URL, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @throttle_rates(token_obtain="2/min")
+    def test_forwarded_for_header_is_not_trusted(self):
+        credentials = {"email": "reader@test.com", "password": "wrong"}
+        statuses = [
+            self.client.post(
+                TOKEN_URL, credentials, HTTP_X_FORWARDED_FOR=f"10.1.0.{i}"
+            ).status_code
+            for i in range(3)
+        ]
+
+        self.assertEqual(statuses[2], status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @throttle_rates(anon="1/min")
+    def test_forwarded_for_header_behind_proxy(self):
+        with override_settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK, "NUM_PROXIES": 1
+        }):
+            # Same proxy, two clients
+            first = self.client.get(BOOK_URL, HTTP_X_FORWARDED_FOR="1.1.1.1")
+            other = self.client.get(BOOK_URL, HTTP_X_FORWARDED_FOR="2.2.2.2")
+            again = self.client.get(
+                BOOK_URL, HTTP_X_FORWARDED_FOR="3.3.3.3, 1.1.1.1"
+            )
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+        self.assertEqual(again.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @throttle_rates(user="3/min", borrowing_create="1/min")
+    def test_scoped_request_takes_user_and_scope_tokens(self):
+        request = Request(APIRequestFactory().get("/"))
+        request.user = get_user_model().objects.get()
+        scoped = SimpleNamespace(throttle_scope="borrowing_create")
+        throttle = BucketThrottle()
+
+        allowed = [
+            throttle.allow_request(request, view)
+            for view in (scoped, scoped, None, None)
+        ]
+
+        self.assertEqual(allowed, [True, False, True, False])
+
+    @throttle_rates(anon=None)
+    def test_rate_none_is_unlimited(self):
+        for _ in range(200):
+            res = self.client.get(BOOK_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bucket_refills_over_time(self):
+        for store in (LocalBucketStore(), CacheBucketStore()):
+            with self.subTest(store=type(store).__name__), mock.patch(
+                "library_service.throttling.time"
+            ) as clock:
+                clock.monotonic.return_value = clock.time.return_value = 100
+                self.assertEqual(store.consume(("s", 1), 2, 1), 0)
+                self.assertEqual(store.consume(("s", 1), 2, 1), 0)
+                self.assertEqual(store.consume(("s", 1), 2, 1), 1)
+
+                clock.monotonic.return_value = clock.time.return_value = 101
+                self.assertEqual(store.consume(("s", 1), 2, 1), 0)
+                self.assertEqual(store.consume(("s", 1), 2, 1), 1)
+
+    def test_local_store_prunes_full_buckets(self):
+        store = LocalBucketStore()
+        store.MAX_BUCKETS = 2
+        with mock.patch("library_service.throttling.time") as clock:
+            clock.monotonic.return_value = 100
+            store.consume(("s", 1), 1, 1)
+            store.consume(("s", 2), 1, 1)
+            clock.monotonic.return_value = 102
+            store.consume(("s", 3), 1, 1)
+
+        self.assertEqual(list(store.buckets), [("s", 3)])